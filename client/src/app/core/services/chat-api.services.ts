@@ -1,6 +1,7 @@
 import { Injectable, inject } from '@angular/core';
 import { HttpClient, HttpHeaders } from '@angular/common/http';
-import { Observable } from 'rxjs';
+import { Observable, of } from 'rxjs';
+import { switchMap, tap } from 'rxjs/operators';
 import { ChatMessage } from '../../store/chat/chat.state';
 
 const isLocal = window.location.hostname === 'localhost' || window.location.hostname === '127.0.0.1';
@@ -15,10 +16,21 @@ export interface StreamEvent {
   value: string;
 }
 
+export interface HydrateResponse {
+  status: string;
+  message: string;
+  added: number;
+  messageCount: number;
+  lastMessageId: string | null;
+  resync: boolean;
+}
+
 @Injectable({ providedIn: 'root' })
 export class ChatApiService {
   private http = inject(HttpClient);
   private apiUrl: string = `${environment.fastApiUrl}/chat`;
+  // chatId -> last DB message id the Python session confirmed holding
+  private hydratedUpTo = new Map<string, string>();
 
   private getFetchAuthHeaders(): Record<string, string> {
     const token = localStorage.getItem('token') || '';
@@ -130,7 +142,28 @@ export class ChatApiService {
     return this.http.post<{ title: string }>(`${this.apiUrl}/generate-title`, { messages }, { headers: this.getAuthHeaders() });
   }
 
-  hydrateHistory(chatId: string, messages: ChatMessage[]): Observable<any> {
-    return this.http.post(`${this.apiUrl}/hydrate-history`, { chatId, messages }, { headers: this.getAuthHeaders() });
+  /**
+   * Sends only the messages after the last one the session confirmed.
+   * The full history goes out on the first hydrate of a chat, when that
+   * message is no longer in the list, or when the server asks to resync.
+   */
+  hydrateHistory(chatId: string, messages: ChatMessage[]): Observable<HydrateResponse> {
+    const post = (body: object) =>
+      this.http.post<HydrateResponse>(`${this.apiUrl}/hydrate-history`, { chatId, ...body }, { headers: this.getAuthHeaders() });
+
+    const afterMessageId = this.hydratedUpTo.get(chatId);
+    const index = afterMessageId ? messages.findIndex(m => m._id === afterMessageId) : -1;
+    const request$ = index >= 0
+      ? post({ messages: messages.slice(index + 1), afterMessageId }).pipe(
+          switchMap(res => res.resync ? post({ messages }) : of(res))
+        )
+      : post({ messages });
+
+    return request$.pipe(
+      tap(res => {
+        if (res.lastMessageId) this.hydratedUpTo.set(chatId, res.lastMessageId);
+        else this.hydratedUpTo.delete(chatId);
+      })
+    );
   }
 }
\ No newline at end of file
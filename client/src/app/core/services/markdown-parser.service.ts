@@ -1,4 +1,6 @@
 import { Injectable } from '@angular/core';
+import { environment } from '../../../environments/environment';
+import { envType } from '../../shared/models/environment';
 
 // Define exported types for block content
 export type CodeContent = { language: string; code: string };
@@ -153,7 +155,7 @@ export class MarkdownParserService {
         
         let imageUrl = '';
         if (mdImageMatch) {
-          imageUrl = mdImageMatch[1]; // Extract URL from parenthesis
+          imageUrl = this.resolveImageUrl(mdImageMatch[1]); // Extract URL from parenthesis
         } else {
           imageUrl = line; // Use raw URL
         }
@@ -181,6 +183,16 @@ export class MarkdownParserService {
     });
   }
 
+  /**
+   * Images from the Python image store arrive as "/api/py/images/<id>".
+   * Resolve them against the FastAPI origin (a different host in local dev).
+   */
+  private resolveImageUrl(url: string): string {
+    const prefix = '/api/py/';
+    if (!url.startsWith(prefix)) return url;
+    return `${(environment as envType).fastApiUrl}/${url.substring(prefix.length)}`;
+  }
+
   /**
    * Parse a markdown table (simple). Returns { headers, rows, title? } or null.
    */
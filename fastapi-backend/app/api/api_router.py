@@ -1,6 +1,6 @@
 # app/api/api_router.py
 from fastapi import APIRouter
-from .endpoints import chat, vision, audio, translate
+from .endpoints import chat, vision, audio, translate, images
 
 api_router = APIRouter()
 
@@ -10,6 +10,7 @@ api_router.include_router(chat.router, prefix="/chat")
 api_router.include_router(vision.router, prefix="/vision")
 api_router.include_router(audio.router, prefix="/audio")
 api_router.include_router(translate.router, prefix="/translate")
+api_router.include_router(images.router, prefix="/images")
 
 # You could add more routers here later:
 # from .endpoints import users
@@ -1,5 +1,8 @@
 # app/api/endpoints/audio.py
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status
+import json
+
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from ...services.stt_service import STTService, get_stt_service
@@ -21,8 +24,22 @@ STTDep = Depends(get_stt_service)
 )
 async def transcribe_audio(
     file: UploadFile = File(...),
+    stream: bool = Query(False, description="Stream NDJSON partial transcripts as segments finish."),
     stt_service: STTService = STTDep,
-) -> STTResponse:
+):
+    if stream:
+        async def stream_partials():
+            parts = []
+            try:
+                async for index, text in stt_service.transcribe_stream(file):
+                    parts.append(text)
+                    yield json.dumps({"index": index, "text": text}) + "\n"
+                yield json.dumps({"done": True, "text": " ".join(p for p in parts if p)}) + "\n"
+            except Exception as e:
+                yield json.dumps({"error": f"Transcription failed: {e}"}) + "\n"
+
+        return StreamingResponse(stream_partials(), media_type="application/x-ndjson")
+
     try:
         text = await stt_service.transcribe(file)
         return STTResponse(text=text)
@@ -31,3 +48,8 @@ async def transcribe_audio(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Transcription failed: {e}",
         )
+
+
+@router.get("/metrics", summary="Transcription cache and upload-size metrics")
+async def transcription_metrics(stt_service: STTService = STTDep) -> dict:
+    return stt_service.metrics.stats()
@@ -1,62 +1,99 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Query
 from fastapi.responses import StreamingResponse
-from typing import List
-import base64
-import io
-from PIL import Image
+from typing import List, Optional
+import asyncio
+import contextlib
 
 from ...models.chat_models import (
     Message,
     StreamRequest,
     TitleRequest,
     TitleResponse,
+    TitleBatchRequest,
+    TitleBatchResponse,
+    TitleBatchResult,
     HydrateRequest,
-    StatusResponse,
+    HydrateResponse,
 )
 from ...services.chat_service import ChatService, get_chat_service
+from ...services.cache_service import get_tool_cache
+from ...services.image_preprocess import compress_images
+from ...services.stream_framing import StreamFramer, negotiate_format, FORMAT_TEXT
+from ...core.config import get_settings
 
 router = APIRouter(tags=["Chat"])
 
 ChatServiceDep = Depends(get_chat_service)
 
 
-def compress_base64_image(base64_str: str, max_size=(512, 512), quality=70) -> str:
+async def stream_until_disconnect(http_request: Request, source, poll_interval: float = 0.5):
     """
-    Decodes a base64 image, resizes it, converts to JPEG, and re-encodes.
+    Yields from source until the client disconnects, then cancels the pending
+    step and closes source so cancellation reaches the agent graph and tools.
     """
+    step = None
     try:
-        if "," in base64_str:
-            header, encoded = base64_str.split(",", 1)
-        else:
-            encoded = base64_str
+        while True:
+            step = asyncio.ensure_future(source.__anext__())
+            while not step.done():
+                await asyncio.wait({step}, timeout=poll_interval)
+                if not step.done() and await http_request.is_disconnected():
+                    return
+            try:
+                chunk = step.result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+    finally:
+        if step is not None and not step.done():
+            step.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration, Exception):
+                await step
+        await source.aclose()
 
-        try:
-            image_data = base64.b64decode(encoded)
-        except Exception:
-            encoded += "=" * ((4 - len(encoded) % 4) % 4)
-            image_data = base64.b64decode(encoded)
 
-        img = Image.open(io.BytesIO(image_data))
+@router.get("/sessions/stats", summary="Session store, eviction and context window statistics")
+async def session_stats_route(chat_service: ChatService = ChatServiceDep) -> dict:
+    return {**chat_service.session_manager.stats(), "context": chat_service.context_window.stats()}
 
-        if img.mode in ("RGBA", "P"):
-            img = img.convert("RGB")
 
-        resample_method = getattr(Image, "Resampling", Image).LANCZOS
-        img.thumbnail(max_size, resample_method)
+@router.get("/graph/stats", summary="Compiled agent graph: compile time vs per-turn acquire time")
+async def graph_stats_route(chat_service: ChatService = ChatServiceDep) -> dict:
+    return chat_service.graph_registry.stats()
 
-        buffered = io.BytesIO()
-        img.save(buffered, format="JPEG", quality=quality)
-        
-        new_encoded = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        
-        # Return strictly as Data URI
-        return f"data:image/jpeg;base64,{new_encoded}"
 
-    except Exception as e:
-        print(f"Error compressing image: {e}")
-        if "," not in base64_str:
-             return f"data:image/jpeg;base64,{base64_str}"
-        return base64_str
+@router.post("/graph/reload-tools", summary="Re-discover MCP tools and rebuild the agent graph if they changed")
+async def graph_reload_tools_route(chat_service: ChatService = ChatServiceDep) -> dict:
+    changed = await chat_service.agent_factory.mcp_manager.reload()
+    return {"changed": changed, **chat_service.graph_registry.stats()}
+
+
+@router.get("/router/stats", summary="Supervisor routing: hits per tier and LLM calls avoided")
+async def router_stats_route(chat_service: ChatService = ChatServiceDep) -> dict:
+    return chat_service.agent_factory.router.stats()
+
+
+@router.get("/speculation/stats", summary="Speculative general answers: hits, misses and wasted tokens")
+async def speculation_stats_route(chat_service: ChatService = ChatServiceDep) -> dict:
+    return {
+        "enabled": chat_service.agent_factory.speculative_general,
+        **chat_service.agent_factory.get_speculation_stats(),
+    }
+
+
+@router.get("/streams/stats", summary="Completed vs cancelled streams and the tokens cancellation saved")
+async def stream_stats_route(chat_service: ChatService = ChatServiceDep) -> dict:
+    return chat_service.cancellation_metrics.stats()
+
+
+@router.get("/titles/stats", summary="Chat titles served per tier (cache, heuristic, LLM)")
+async def title_stats_route(chat_service: ChatService = ChatServiceDep) -> dict:
+    return chat_service.title_generator.stats()
+
+
+@router.get("/tools/cache/stats", summary="Tool result cache hit rates (memory and disk tiers)")
+async def tool_cache_stats_route() -> dict:
+    return get_tool_cache().stats()
 
 
 @router.get("/{session_id}", response_model=List[Message])
@@ -70,16 +107,14 @@ async def handle_get_chat_history(session_id: str, chat_service: ChatService = C
 @router.post("/stream", summary="Stream Chat Response")
 async def handle_chat_stream(
     request: StreamRequest,
+    http_request: Request,
+    format: Optional[str] = Query(None, description="Stream framing: 'sse', 'ndjson' or 'text' (default)."),
     chat_service: ChatService = ChatServiceDep,
 ):
     async def event_generator(): 
         try:
-            # Process multiple images
-            processed_images = []
-            if request.images:
-                for img_str in request.images:
-                    if img_str and len(img_str.strip()) > 0:
-                        processed_images.append(compress_base64_image(img_str))
+            # Process multiple images (concurrently, off the event loop)
+            processed_images = await compress_images(request.images or [])
 
             # Pass the list to the service
             async for chunk in chat_service.stream_groq_message(
@@ -93,7 +128,23 @@ async def handle_chat_stream(
         except Exception as e:
             yield f"[Error] {str(e)}"
 
-    return StreamingResponse(event_generator(), media_type="text/plain")
+    # Framed mode (SSE / NDJSON) is negotiated; plain text stays the default
+    stream_format = negotiate_format(http_request.headers.get("accept"), format)
+    stream = stream_until_disconnect(http_request, event_generator())
+    if stream_format == FORMAT_TEXT:
+        return StreamingResponse(stream, media_type="text/plain")
+
+    settings = get_settings()
+    framer = StreamFramer(
+        stream_format,
+        flush_interval=settings.STREAM_FLUSH_INTERVAL_MS / 1000,
+        heartbeat_interval=settings.STREAM_HEARTBEAT_SECONDS,
+    )
+    return StreamingResponse(
+        framer.frame(stream),
+        media_type=framer.media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/generate-title", response_model=TitleResponse)
@@ -105,10 +156,26 @@ async def generate_title_route(request: TitleRequest, chat_service: ChatService
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/hydrate-history", response_model=StatusResponse)
+@router.post("/generate-titles", response_model=TitleBatchResponse, summary="Retitle many chats (backfills)")
+async def generate_titles_route(request: TitleBatchRequest, chat_service: ChatService = ChatServiceDep):
+    max_chats = get_settings().TITLE_BATCH_MAX_CHATS
+    if len(request.chats) > max_chats:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {max_chats} chats per batch.")
+    try:
+        titles = await chat_service.generate_chat_titles([chat.messages for chat in request.chats])
+        return TitleBatchResponse(
+            titles=[TitleBatchResult(chatId=chat.chatId, title=title) for chat, title in zip(request.chats, titles)]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/hydrate-history", response_model=HydrateResponse)
 async def hydrate_history_route(request: HydrateRequest, chat_service: ChatService = ChatServiceDep):
     try:
-        await chat_service.hydrate_chat_history(request.chatId, request.messages)
-        return StatusResponse(status="success", message="History hydrated")
+        result = await chat_service.hydrate_chat_history(
+            request.chatId, request.messages, replace=request.replace, after_id=request.afterMessageId
+        )
+        return HydrateResponse(status="success", message="History hydrated", **result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,35 @@
+# app/api/endpoints/images.py
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import FileResponse, Response
+
+from ...services.blob_store import BlobStore, get_blob_store
+
+router = APIRouter(tags=["Images"])
+
+BlobStoreDep = Depends(get_blob_store)
+
+# Blobs are content-addressed, so a given URL never changes
+CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+
+@router.get(
+    "/{blob_id}",
+    summary="Serve a stored image by its content hash",
+    response_class=FileResponse,
+)
+async def get_image(
+    blob_id: str,
+    request: Request,
+    blob_store: BlobStore = BlobStoreDep,
+):
+    found = await blob_store.aget(blob_id)
+    if found is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found.")
+
+    etag = f'"{blob_id}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**CACHE_HEADERS, "ETag": etag})
+
+    path, media_type = found
+    # FileResponse streams the file in chunks and answers Range requests
+    return FileResponse(path, media_type=media_type, headers={**CACHE_HEADERS, "ETag": etag})
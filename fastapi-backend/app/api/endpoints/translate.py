@@ -1,7 +1,11 @@
 # app/api/endpoints/translate.py
+from typing import Dict, List
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 
+from ...core.config import get_settings
+
 from ...services.translation_service import (
     TranslationService,
     get_translation_service,
@@ -19,6 +23,15 @@ class TranslationResponse(BaseModel):
     translated_text: str
 
 
+class BatchTranslationRequest(BaseModel):
+    segments: List[str]
+    target_languages: List[str]
+
+
+class BatchTranslationResponse(BaseModel):
+    translations: Dict[str, List[str]]  # Language -> translations in input order
+
+
 TranslateDep = Depends(get_translation_service)
 
 
@@ -41,3 +54,38 @@ async def translate_text(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Translation failed: {e}",
         )
+
+
+@router.post(
+    "/batch",
+    response_model=BatchTranslationResponse,
+    summary="Translate many segments into one or more languages",
+)
+async def translate_batch(
+    request: BatchTranslationRequest,
+    translation_service: TranslationService = TranslateDep,
+) -> BatchTranslationResponse:
+    max_segments = get_settings().TRANSLATE_BATCH_MAX_SEGMENTS
+    if not request.target_languages:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="target_languages must not be empty.")
+    if len(request.segments) > max_segments:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {max_segments} segments per batch.",
+        )
+
+    try:
+        translations = await translation_service.translate_batch(
+            request.segments, request.target_languages
+        )
+        return BatchTranslationResponse(translations=translations)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Translation failed: {e}",
+        )
+
+
+@router.get("/stats", summary="Translation memory hit rate and size")
+async def translation_stats(translation_service: TranslationService = TranslateDep) -> dict:
+    return translation_service.memory.stats()
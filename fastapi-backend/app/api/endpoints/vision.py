@@ -1,6 +1,10 @@
 # app/api/endpoints/vision.py
+from typing import List
+
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from ...core.config import get_settings
 from ...services.vision_service import VisionService, get_vision_service
 
 router = APIRouter(tags=["Vision"])
@@ -9,12 +13,30 @@ router = APIRouter(tags=["Vision"])
 class VisionRequest(BaseModel):
     image_url: str
     prompt: str | None = None
+    session_id: str | None = None  # Scopes cached answers; anonymous requests only get exact-image hits
 
 
 class VisionResponse(BaseModel):
     result: str
 
 
+class VisionBatchRequest(BaseModel):
+    images: List[VisionRequest]
+    prompt: str | None = None  # Default for items without their own prompt
+    stream: bool = False  # NDJSON results as they complete instead of one ordered list
+    session_id: str | None = None
+
+
+class VisionBatchResult(BaseModel):
+    index: int
+    result: str | None = None
+    error: str | None = None
+
+
+class VisionBatchResponse(BaseModel):
+    results: List[VisionBatchResult]
+
+
 VisionDep = Depends(get_vision_service)
 
 
@@ -31,6 +53,7 @@ async def analyze_image(
         result = await vision_service.analyze_image(
             image_url=request.image_url,
             prompt=request.prompt,
+            scope=request.session_id,
         )
         return VisionResponse(result=result)
     except Exception as e:
@@ -38,3 +61,39 @@ async def analyze_image(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Vision analysis failed: {e}",
         )
+
+
+@router.post(
+    "/analyze-batch",
+    response_model=VisionBatchResponse,
+    summary="Analyze many images with bounded concurrency",
+)
+async def analyze_image_batch(
+    request: VisionBatchRequest,
+    vision_service: VisionService = VisionDep,
+):
+    settings = get_settings()
+    if not request.images:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="images must not be empty.")
+    if len(request.images) > settings.VISION_BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.VISION_BATCH_MAX_IMAGES} images per batch.",
+        )
+
+    items = [(item.image_url, item.prompt or request.prompt) for item in request.images]
+    results = vision_service.analyze_many(
+        items, concurrency=settings.VISION_BATCH_CONCURRENCY, scope=request.session_id
+    )
+
+    if request.stream:
+        async def stream_results():
+            async for index, result, error in results:
+                yield VisionBatchResult(index=index, result=result, error=error).model_dump_json() + "\n"
+
+        return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+    ordered = [None] * len(items)
+    async for index, result, error in results:
+        ordered[index] = VisionBatchResult(index=index, result=result, error=error)
+    return VisionBatchResponse(results=ordered)
@@ -1,11 +1,13 @@
 import json
 import re
+import asyncio
 import operator
 import logging
 import sys
 from typing import Annotated, TypedDict, List
 
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 
 from ..core.config import get_settings
@@ -14,6 +16,7 @@ from ..services.tools_service import ToolsService
 from ..services.image_service import ImageService
 from ..services.youtube_service import YoutubeService
 from .mcp_manager import MCPManager
+from .intent_router import IntentRouter
 from ..services.regulations import SafetyRegulations
 
 logging.basicConfig(
@@ -29,6 +32,7 @@ class AgentState(TypedDict):
 
 class AgentGraphFactory:
     def __init__(self):
+        settings = get_settings()
         self.llm_factory = get_llm_factory()
         self.supervisor_llm = self.llm_factory.get_reasoning_model()
         self.tooling_llm = self.llm_factory.get_tooling_model()
@@ -39,13 +43,43 @@ class AgentGraphFactory:
         self.youtube_service = YoutubeService()
         self.mcp_manager = MCPManager()
         self.regulations = SafetyRegulations()
+        self.router = IntentRouter(
+            cache_size=settings.ROUTER_CACHE_SIZE,
+            min_confidence=settings.ROUTER_MIN_CONFIDENCE,
+            decision_log=settings.ROUTER_DECISION_LOG,
+        )
         
         self.search_tool = self.tools_service.get_search_tool()
         self.yt_search_tool = self.youtube_service.get_search_tool()
         self.yt_transcript_tool = self.youtube_service.get_transcript_tool()
         self.yt_details_tool = self.youtube_service.get_details_tool()
 
-    async def supervisor_node(self, state: AgentState):
+        # --- Researcher Tool Execution ---
+        self.base_research_tools = [self.search_tool, self.yt_search_tool, self.yt_transcript_tool, self.yt_details_tool]
+        self.set_extra_tools([])
+        self.tool_timeout = settings.RESEARCH_TOOL_TIMEOUT
+        self.tool_semaphore = asyncio.Semaphore(settings.RESEARCH_TOOL_CONCURRENCY)
+
+        # --- Speculative General Agent ---
+        self.speculative_general = settings.SPECULATIVE_GENERAL
+        self.speculation_stats = {"launched": 0, "hits": 0, "misses": 0, "wasted_tokens": 0}
+
+    def set_extra_tools(self, tools: List):
+        """Researcher tools beyond the built-in ones (e.g. discovered over MCP). Rebuild the graph after."""
+        self.research_tools = self.base_research_tools + list(tools)
+        self.research_tools_by_name = {t.name: t for t in self.research_tools}
+
+    @staticmethod
+    def _request_context(config: RunnableConfig | None) -> dict:
+        """Per-request values (language, user context, aspect ratio) passed via graph config."""
+        configurable = (config or {}).get("configurable") or {}
+        return {
+            "language": configurable.get("language") or "English",
+            "user_context": configurable.get("user_context"),
+            "aspect_ratio": configurable.get("aspect_ratio") or "16:9",
+        }
+
+    async def supervisor_node(self, state: AgentState, config: RunnableConfig):
         messages = state["messages"]
         last_message = messages[-1]
         content_text = ""
@@ -57,11 +91,11 @@ class AgentGraphFactory:
             if any(item['type'] == 'image_url' for item in last_message.content):
                 return {"next_agent": "visionary"}
 
-        lower = content_text.lower()
-        if any(x in lower for x in ["video", "youtube", "watch", "play", "transcript", "trailer", "song"]):
-            return {"next_agent": "researcher"}
-        if any(x in lower for x in ["generate", "draw", "paint", "imagine", "create a picture", "image of"]):
-            return {"next_agent": "artist"}
+        # Cheap tiers first (cache -> keywords -> local classifier)
+        has_context = any(not isinstance(m, SystemMessage) for m in messages[:-1])
+        decision = self.router.route(content_text, has_context=has_context)
+        if decision:
+            return {"next_agent": decision[0]}
 
         system_prompt = (
             "You are the Supervisor. Classify the user intent.\n"
@@ -70,6 +104,9 @@ class AgentGraphFactory:
             "FORMAT: Output JSON only: {\"next\": \"<AGENT>\"}"
         )
         
+        # Opt-in: start the general answer while the LLM classifies
+        slot = self._start_speculation(state, config)
+
         try:
             context = messages[-3:] if len(messages) > 3 else messages
             response = await self.supervisor_llm.ainvoke([SystemMessage(content=system_prompt)] + context)
@@ -79,13 +116,61 @@ class AgentGraphFactory:
             if start != -1 and end != -1:
                 data = json.loads(content[start:end])
                 next_agent = data.get("next", "general")
+                self.router.record_llm_decision(content_text, next_agent, has_context=has_context)
             else:
                 next_agent = "general"
         except:
             next_agent = "general"
+
+        if slot is not None:
+            self._resolve_speculation(slot, next_agent)
         
         return {"next_agent": next_agent}
 
+    # --- Speculative Execution ---
+
+    def _start_speculation(self, state: AgentState, config: RunnableConfig) -> dict | None:
+        """
+        Launches general_node's LLM call in the background. Its stream events are
+        tagged 'speculative' so the chat stream holds them until the supervisor agrees.
+        """
+        slot = ((config or {}).get("configurable") or {}).get("speculation")
+        if not self.speculative_general or slot is None:
+            return None
+
+        spec_config = {**config, "metadata": {**(config.get("metadata") or {}), "speculative": True}}
+        slot.update({"tokens": 0, "adopt": False})
+        slot["task"] = asyncio.create_task(self._speculate_general(state["messages"], config, spec_config, slot))
+        self.speculation_stats["launched"] += 1
+        return slot
+
+    async def _speculate_general(self, messages, config: RunnableConfig, spec_config: RunnableConfig, slot: dict) -> AIMessage:
+        prompt = [SystemMessage(content=self._general_instruction(self._request_context(config)))] + messages
+        response = None
+        async for chunk in self.tooling_llm.astream(prompt, config=spec_config):
+            slot["tokens"] += 1
+            response = chunk if response is None else response + chunk
+        return AIMessage(content=response.content if response else "")
+
+    def _resolve_speculation(self, slot: dict, next_agent: str):
+        task = slot.get("task")
+        if task is None:
+            return
+        if next_agent == "general":
+            slot["adopt"] = True
+            self.speculation_stats["hits"] += 1
+        else:
+            task.cancel()
+            slot.pop("task", None)
+            self.speculation_stats["misses"] += 1
+            self.speculation_stats["wasted_tokens"] += slot.get("tokens", 0)
+
+    def get_speculation_stats(self) -> dict:
+        stats = dict(self.speculation_stats)
+        launched = stats["launched"]
+        stats["hit_rate"] = round(stats["hits"] / launched, 3) if launched else 0.0
+        return stats
+
     async def researcher_node(self, state: AgentState):
         messages = state["messages"]
         query = messages[-1].content
@@ -101,38 +186,21 @@ class AgentGraphFactory:
             except: pass
 
         # 2. Tool Selection
-        tools = [self.search_tool, self.yt_search_tool, self.yt_transcript_tool, self.yt_details_tool]
-        model_with_tools = self.tooling_llm.bind_tools(tools)
+        model_with_tools = self.tooling_llm.bind_tools(self.research_tools)
         
         try:
-            sys_msg = "You are a Researcher. Call the best tool. Do not answer text, just call the tool."
+            sys_msg = "You are a Researcher. Call the best tools. Do not answer text, just call the tools."
             response = await model_with_tools.ainvoke([SystemMessage(content=sys_msg), HumanMessage(content=refined_query)])
             
             thought_prefix = f"THOUGHT: Research Strategy - Investigating '{refined_query}'."
 
             if response.tool_calls:
-                tc = response.tool_calls[0]
-                tool_name = tc["name"]
-                args = tc["args"]
-                tool_id = tc["id"]
-                
-                if tool_name == "google_search":
-                    res = await self.search_tool.ainvoke(args)
-                elif tool_name == "search_youtube":
-                    res = await self.yt_search_tool.ainvoke(args.get("query"))
-                elif tool_name == "get_video_details":
-                    res = await self.yt_details_tool.ainvoke(args.get("video_id"))
-                elif tool_name == "get_video_transcript":
-                    res = await self.yt_transcript_tool.ainvoke(args.get("video_id"))
-                else:
-                    res = "Error"
+                # 3. Run every requested call concurrently (one ToolMessage per call)
+                tool_messages = await asyncio.gather(*[self._run_tool_call(tc, refined_query) for tc in response.tool_calls])
                 
-                # IMPORTANT: Return ToolMessage to persist history
+                # IMPORTANT: Return ToolMessages to persist history
                 return {
-                    "messages": [
-                        AIMessage(content=thought_prefix, tool_calls=[tc]),
-                        ToolMessage(content=str(res), tool_call_id=tool_id, name=tool_name)
-                    ]
+                    "messages": [AIMessage(content=thought_prefix, tool_calls=response.tool_calls)] + list(tool_messages)
                 }
 
             # Fallback
@@ -142,12 +210,33 @@ class AgentGraphFactory:
         except Exception as e:
             return {"messages": [AIMessage(content=json.dumps({"summary": f"Error: {e}"}), name="Researcher")]}
 
-    async def general_node(self, state: AgentState):
-        messages = state["messages"]
-        core_prompt = self.regulations.get_general_prompt()
-        print("Messages to General Node:", messages)
-        
-        system_instruction = (
+    async def _run_tool_call(self, tc: dict, refined_query: str = "") -> ToolMessage:
+        """Executes a single tool call under the shared concurrency cap and timeout."""
+        tool_name = tc["name"]
+        tool = self.research_tools_by_name.get(tool_name)
+        args = dict(tc["args"])
+
+        # Transcripts are retrieved by relevance to the user's question
+        if tool_name == "get_video_transcript" and not args.get("query"):
+            args["query"] = refined_query
+
+        if tool is None:
+            res = f"Error: Unknown tool '{tool_name}'."
+        else:
+            try:
+                async with self.tool_semaphore:
+                    res = await asyncio.wait_for(tool.ainvoke(args), timeout=self.tool_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Tool '{tool_name}' timed out after {self.tool_timeout}s")
+                res = f"Error: {tool_name} timed out."
+            except Exception as e:
+                res = f"Error: {tool_name} failed: {e}"
+
+        return ToolMessage(content=str(res), tool_call_id=tc["id"], name=tool_name)
+
+    def _general_instruction(self, ctx: dict) -> str:
+        core_prompt = self.regulations.get_general_prompt(ctx["language"], ctx["user_context"])
+        return (
             f"{core_prompt}\n\n"
             "**OUTPUT FORMAT:**\n"
             "1. Start with 'THOUGHT: <Reasoning>'.\n"
@@ -158,6 +247,21 @@ class AgentGraphFactory:
             "3. **YOUTUBE:** Embed video using [[YOUTUBE: <ID>]].\n"
             "4. **IMAGE:** Only if asked, use [[GENERATE_IMAGE: <Prompt>]].\n"
         )
+
+    async def general_node(self, state: AgentState, config: RunnableConfig):
+        messages = state["messages"]
+        print("Messages to General Node:", messages)
+
+        # Adopt the speculative answer if the supervisor agreed with it
+        slot = ((config or {}).get("configurable") or {}).get("speculation") or {}
+        task = slot.pop("task", None) if slot.get("adopt") else None
+        if task is not None:
+            try:
+                return {"messages": [await task]}
+            except Exception as e:
+                logger.error(f"Speculative general run failed, re-running: {e}")
+
+        system_instruction = self._general_instruction(self._request_context(config))
         
         try:
             response = await self.tooling_llm.ainvoke([SystemMessage(content=system_instruction)] + messages)
@@ -165,11 +269,12 @@ class AgentGraphFactory:
         except Exception as e:
             return {"messages": [AIMessage(content=f"THOUGHT: Error.\nSystem error: {e}")]}
 
-    async def artist_node(self, state: AgentState):
+    async def artist_node(self, state: AgentState, config: RunnableConfig):
         msg = state["messages"][-1].content
         prompt = msg if isinstance(msg, str) else msg[0]['text']
         clean_prompt = prompt.replace("generate image of", "").strip()
-        res = await self.image_service.generate_image(clean_prompt)
+        aspect_ratio = self._request_context(config)["aspect_ratio"]
+        res = await self.image_service.generate_image(clean_prompt, aspect_ratio=aspect_ratio)
         final = res if isinstance(res, str) else res.get('image', '')
         return {"messages": [AIMessage(content=f"THOUGHT: Generating image.\n{final}", name="Artist")]}
 
@@ -32,6 +32,84 @@ class Settings(BaseSettings):
     PINECONE_INDEX_NAME: str = "ultron-memory"
     GOOGLE_API_KEY: str | None = None
     GOOGLE_CSE_ID: str | None = None
+    GOOGLE_CSE_ENDPOINT: str = "https://www.googleapis.com/customsearch/v1"
+
+    # --- Search HTTP Pool ---
+    SEARCH_HTTP_TIMEOUT: float = 10.0
+    SEARCH_MAX_CONNECTIONS: int = 20
+
+    # --- Tool Result Cache ---
+    TOOL_CACHE_PATH: str | None = ".cache/tool_cache.sqlite3"  # None disables the disk tier
+    TOOL_CACHE_MEMORY_ITEMS: int = 512
+
+    # --- Transcript Retrieval ---
+    TRANSCRIPT_CHUNK_CHARS: int = 1000
+    TRANSCRIPT_TOP_K: int = 5
+    TRANSCRIPT_TOKEN_BUDGET: int = 1200
+
+    # --- Chat Stream Framing (SSE / NDJSON) ---
+    STREAM_FLUSH_INTERVAL_MS: int = 50  # Answer deltas are coalesced over this window
+    STREAM_HEARTBEAT_SECONDS: float = 15.0
+
+    # --- Image Generation ---
+    IMAGE_GENERATION_CONCURRENCY: int = 2  # Per answer
+    IMAGE_STORE_PATH: str = ".cache/images"  # Content-addressed store for generated/uploaded images
+    IMAGE_STORE_MAX_BYTES: int = 512 * 1024 * 1024
+    IMAGE_PREPROCESS_WORKERS: int = 2  # Process pool for upload resizing / re-encoding
+
+    # --- Vision ---
+    VISION_MAX_CONNECTIONS: int = 10
+    VISION_BATCH_CONCURRENCY: int = 4
+    VISION_BATCH_MAX_IMAGES: int = 32
+
+    # --- Speech to Text ---
+    STT_SEGMENT_SECONDS: float = 60.0  # Longer audio is split and transcribed in parallel
+    STT_SEGMENT_OVERLAP_SECONDS: float = 1.5
+    STT_SILENCE_SEARCH_SECONDS: float = 10.0  # Look this far back from each target cut for a quiet spot
+    STT_CONCURRENCY: int = 4
+    STT_SILENCE_RELATIVE: float = 0.05  # Frames quieter than this fraction of the clip's loudest frame (-26 dB) are silence
+    STT_SILENCE_FLOOR: float = 30.0  # int16 RMS (about -60 dBFS) below which a frame is always silence
+    STT_TRIM_PADDING_SECONDS: float = 0.25
+
+    # --- Chat Sessions ---
+    SESSION_MAX_SESSIONS: int = 1000  # Resident sessions per worker
+    SESSION_MAX_BYTES: int = 256 * 1024 * 1024  # Includes base64 image payloads
+    SESSION_IDLE_TTL_SECONDS: float = 60 * 60
+    SESSION_SPILL_PATH: str | None = ".cache/sessions"  # Evicted sessions are spilled here and reloaded on access
+    SESSION_BACKEND: str = "memory"  # "memory" (per worker) or "sqlite" (shared by all workers on the host)
+    SESSION_DB_PATH: str = ".cache/sessions.sqlite3"
+    SESSION_HISTORY_MESSAGES: int = 100  # Retained per session; the prompt is cut by token budget below
+
+    # --- Context Window ---
+    CONTEXT_TOKEN_BUDGET: int = 6000  # History tokens per prompt, for models without their own entry
+    CONTEXT_MODEL_TOKEN_BUDGETS: dict[str, int] = {}  # e.g. {"meta-llama/llama-4-scout-17b-16e-instruct": 12000}
+    CONTEXT_SUMMARY_TOKEN_BUDGET: int = 400  # Target size of the rolling summary of older turns
+    IMAGE_CAPTION_CONCURRENCY: int = 2  # Background caption calls for past images (sent as text, not pixels)
+
+    # --- Chat Titles ---
+    TITLE_BATCH_CONCURRENCY: int = 4
+    TITLE_BATCH_MAX_CHATS: int = 200
+
+    # --- Translation ---
+    TRANSLATE_PACK_TOKEN_BUDGET: int = 1500  # Source tokens per batched LLM call
+    TRANSLATE_PACK_MAX_SEGMENTS: int = 40
+    TRANSLATE_CONCURRENCY: int = 4
+    TRANSLATE_BATCH_MAX_SEGMENTS: int = 500
+    TRANSLATION_MEMORY_PATH: str | None = ".cache/translation_memory.sqlite3"  # None keeps it in memory only
+    TRANSLATION_MEMORY_ITEMS: int = 2048  # In-memory entries (also the pre-warm size)
+
+    # --- Vision Answer Cache ---
+    VISION_CACHE_SIZE: int = 256
+    VISION_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    VISION_CACHE_MAX_DISTANCE: int = 4  # Max differing bits in both the 64- and 256-bit dHash for a near-duplicate
+
+    # --- Agent Routing ---
+    ROUTER_CACHE_SIZE: int = 1024
+    ROUTER_MIN_CONFIDENCE: float = 0.45
+    ROUTER_DECISION_LOG: str | None = None  # JSONL of LLM routing decisions, used to train the local classifier
+    SPECULATIVE_GENERAL: bool = False  # Start the general answer while the supervisor LLM decides
+    RESEARCH_TOOL_TIMEOUT: float = 20.0  # Seconds per researcher tool call
+    RESEARCH_TOOL_CONCURRENCY: int = 4
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -0,0 +1,256 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("uvicorn.error")
+
+AGENTS = ("researcher", "coder", "artist", "general")
+
+# --- Tier 1: Keyword Rules ---
+KEYWORD_RULES: List[Tuple[str, List[str]]] = [
+    ("researcher", ["video", "youtube", "watch", "play", "transcript", "trailer", "song"]),
+    ("artist", ["generate", "draw", "paint", "imagine", "create a picture", "image of"]),
+]
+
+# --- Tier 2: Seed examples for the local classifier ---
+# Logged LLM decisions are added on top of these as traffic comes in.
+SEED_EXAMPLES: Dict[str, List[str]] = {
+    "researcher": [
+        "what is the latest news today",
+        "who won the match yesterday",
+        "current price of bitcoin",
+        "weather forecast for tomorrow",
+        "when is the next election",
+        "search the web for recent updates",
+    ],
+    "coder": [
+        "write a python function to sort a list",
+        "fix this bug in my javascript code",
+        "how do i center a div in css",
+        "explain this error traceback",
+        "write a sql query to join two tables",
+        "implement binary search in java",
+    ],
+    "artist": [
+        "make a logo for my startup",
+        "sketch a cat wearing a hat",
+        "illustration of a sunset over mountains",
+        "design a poster for a concert",
+    ],
+    "general": [
+        "hi",
+        "hello how are you",
+        "thank you",
+        "tell me a joke",
+        "what is my name",
+        "who are you",
+        "good morning",
+    ],
+}
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+# Follow-ups whose meaning depends on the previous turn ("yes", "tell me more", "do it in java")
+_FOLLOW_UP_RE = re.compile(
+    r"^(?:yes|yeah|yep|no|nope|ok|okay|sure|and|but|so|also|then|why|how come|more|continue|go on|"
+    r"tell me more|what about|how about|same|again|do it|do that|the first|the second|the last)\b"
+)
+_REFERENCE_WORDS = {"it", "that", "this", "those", "these", "them", "one", "above", "previous", "again", "more"}
+
+
+def normalize_query(text: str) -> str:
+    """Lowercases, strips punctuation and collapses whitespace."""
+    text = _PUNCT_RE.sub(" ", (text or "").lower())
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def is_follow_up(key: str) -> bool:
+    """True for short or referential queries that can't be routed without the prior turn."""
+    words = key.split()
+    if len(words) < 3 or _FOLLOW_UP_RE.match(key):
+        return True
+    return len(words) <= 6 and bool(_REFERENCE_WORDS.intersection(words))
+
+
+class NgramCentroidClassifier:
+    """
+    Nearest-centroid classifier over word unigrams and character trigrams.
+    Centroids are running sums, so learning a new example is O(features).
+    """
+
+    def __init__(self):
+        self._sums: Dict[str, Counter] = defaultdict(Counter)
+        self._centroids: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def _features(text: str) -> Dict[str, float]:
+        feats = Counter()
+        for word in text.split():
+            feats[f"w:{word}"] += 1.0
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                feats[f"c:{padded[i:i + 3]}"] += 0.5
+        norm = math.sqrt(sum(v * v for v in feats.values())) or 1.0
+        return {k: v / norm for k, v in feats.items()}
+
+    def learn(self, text: str, label: str):
+        feats = self._features(text)
+        if not feats:
+            return
+        self._sums[label].update(feats)
+        total = self._sums[label]
+        norm = math.sqrt(sum(v * v for v in total.values())) or 1.0
+        self._centroids[label] = {k: v / norm for k, v in total.items()}
+
+    def predict(self, text: str) -> Tuple[Optional[str], float, float]:
+        """Returns (label, best_score, margin_over_runner_up)."""
+        feats = self._features(text)
+        if not feats or not self._centroids:
+            return None, 0.0, 0.0
+
+        scores = sorted(
+            ((sum(v * centroid.get(k, 0.0) for k, v in feats.items()), label)
+             for label, centroid in self._centroids.items()),
+            reverse=True,
+        )
+        best_score, best_label = scores[0]
+        runner_up = scores[1][0] if len(scores) > 1 else 0.0
+        return best_label, best_score, best_score - runner_up
+
+
+class IntentRouter:
+    """
+    Tiered routing for the supervisor:
+      0. LRU cache of normalized query -> agent
+      1. Keyword rules
+      2. Local n-gram classifier (only when confident)
+      3. LLM (caller falls back to it when route() returns None)
+
+    Follow-ups in an ongoing conversation ("yes", "tell me more") skip the
+    cache and classifier and are never cached or learned from: the LLM
+    routed them using earlier turns, which the key doesn't include.
+    """
+
+    def __init__(
+        self,
+        cache_size: int = 1024,
+        min_confidence: float = 0.45,
+        min_margin: float = 0.1,
+        decision_log: Optional[str] = None,
+    ):
+        self.cache_size = cache_size
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self.decision_log = decision_log
+
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"cache": 0, "keyword": 0, "classifier": 0, "llm": 0}
+
+        self.classifier = NgramCentroidClassifier()
+        for label, examples in SEED_EXAMPLES.items():
+            for example in examples:
+                self.classifier.learn(normalize_query(example), label)
+        self._load_decision_log()
+
+    def route(self, text: str, has_context: bool = False) -> Optional[Tuple[str, str]]:
+        """
+        Returns (agent, tier) if a cheap tier is sure, otherwise None so the
+        caller asks the LLM and reports back via record_llm_decision().
+        has_context: the conversation has earlier turns.
+        """
+        key = normalize_query(text)
+        if not key:
+            return None
+        follow_up = has_context and is_follow_up(key)
+
+        with self._lock:
+            cached = None if follow_up else self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.counters["cache"] += 1
+                return cached, "cache"
+
+        lower = (text or "").lower()
+        for agent, keywords in KEYWORD_RULES:
+            if any(x in lower for x in keywords):
+                self._remember(key, agent, "keyword", cache=not follow_up)
+                return agent, "keyword"
+
+        if follow_up:
+            return None
+
+        label, score, margin = self.classifier.predict(key)
+        if label and score >= self.min_confidence and margin >= self.min_margin:
+            self._remember(key, label, "classifier")
+            return label, "classifier"
+
+        return None
+
+    def record_llm_decision(self, text: str, agent: str, has_context: bool = False):
+        """Caches the LLM's decision and feeds it back into the classifier."""
+        key = normalize_query(text)
+        if not key or agent not in AGENTS:
+            return
+        if has_context and is_follow_up(key):
+            self._count("llm")  # Decided from context; not reusable for other conversations
+            return
+        self._remember(key, agent, "llm")
+        self.classifier.learn(key, agent)
+        self._append_decision_log(key, agent)
+
+    def _count(self, tier: str):
+        with self._lock:
+            self.counters[tier] += 1
+
+    def _remember(self, key: str, agent: str, tier: str, cache: bool = True):
+        with self._lock:
+            self.counters[tier] += 1
+            if not cache:
+                return
+            self._cache[key] = agent
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # --- Logged routing decisions ---
+
+    def _load_decision_log(self):
+        if not self.decision_log or not os.path.exists(self.decision_log):
+            return
+        try:
+            with open(self.decision_log, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue
+                    # Skip follow-ups logged before they were excluded
+                    if row.get("agent") in AGENTS and row.get("query") and not is_follow_up(row["query"]):
+                        self.classifier.learn(row["query"], row["agent"])
+        except OSError as e:
+            logger.error(f"[IntentRouter] Could not read decision log: {e}")
+
+    def _append_decision_log(self, key: str, agent: str):
+        if not self.decision_log:
+            return
+        try:
+            with open(self.decision_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"query": key, "agent": agent}) + "\n")
+        except OSError as e:
+            logger.error(f"[IntentRouter] Could not write decision log: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        total = sum(self.counters.values())
+        stats = dict(self.counters)
+        stats["total"] = total
+        stats["llm_avoided_rate"] = round(1 - self.counters["llm"] / total, 3) if total else 0.0
+        for tier, count in self.counters.items():
+            stats[f"{tier}_hit_rate"] = round(count / total, 3) if total else 0.0
+        return stats
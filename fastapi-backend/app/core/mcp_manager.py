@@ -1,9 +1,14 @@
 import asyncio
-from typing import List
+import logging
+from typing import Awaitable, Callable, List
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 from langchain_core.tools import tool, StructuredTool
 
+logger = logging.getLogger("uvicorn.error")
+
+ToolsChangedCallback = Callable[[List[StructuredTool]], Awaitable[None]]
+
 class MCPManager:
     def __init__(self):
         # Configuration for external MCP Servers
@@ -15,6 +20,28 @@ class MCPManager:
             #     args=["-y", "@modelcontextprotocol/server-filesystem", "/Users/username/Desktop"]
             # )
         ]
+        self.tools: List[StructuredTool] = []
+        self._listeners: List[ToolsChangedCallback] = []
+
+    def on_tools_changed(self, callback: ToolsChangedCallback):
+        """Registers a coroutine called with the new tool list whenever reload() finds a change."""
+        self._listeners.append(callback)
+
+    async def reload(self) -> bool:
+        """
+        Re-discovers tools from the configured servers. Returns True (after
+        notifying listeners) if the set of tool names or descriptions changed.
+        """
+        tools = await self.get_tools()
+        signature = sorted((t.name, t.description) for t in tools)
+        if signature == sorted((t.name, t.description) for t in self.tools):
+            return False
+
+        self.tools = tools
+        logger.info(f"[MCP] Tool set changed: {[t.name for t in tools]}")
+        for callback in self._listeners:
+            await callback(tools)
+        return True
 
     async def get_tools(self) -> List[StructuredTool]:
         """
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 
 # --- Re-usable Base Models ---
@@ -8,6 +8,9 @@ class ContentItem(BaseModel):
     value: str
 
 class Message(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: Optional[str] = Field(None, alias="_id")  # DB id; lets hydration skip messages it already has
     sender: str
     content: List[ContentItem]
 
@@ -24,7 +27,15 @@ class RootResponse(BaseModel):
 
 class HydrateRequest(BaseModel):
     chatId: str
-    messages: List[Message]
+    messages: List[Message]  # Full history, or only the messages after lastMessageId
+    afterMessageId: Optional[str] = None  # Set when `messages` is a delta after this DB id
+    replace: bool = False  # Rebuild the session from scratch instead of merging
+
+class HydrateResponse(StatusResponse):
+    added: int  # Messages converted by this call
+    messageCount: int  # Messages now held for the session
+    lastMessageId: Optional[str] = None  # Send only messages after this one next time
+    resync: bool = False  # The delta's anchor is gone (evicted/restarted): resend the full history
 
 # --- Chat Streaming Endpoints ---
 
@@ -42,4 +53,18 @@ class TitleRequest(BaseModel):
     messages: List[Message]
 
 class TitleResponse(BaseModel):
-    title: str
\ No newline at end of file
+    title: str
+
+class TitleBatchItem(BaseModel):
+    chatId: str
+    messages: List[Message]
+
+class TitleBatchRequest(BaseModel):
+    chats: List[TitleBatchItem]
+
+class TitleBatchResult(BaseModel):
+    chatId: str
+    title: str
+
+class TitleBatchResponse(BaseModel):
+    titles: List[TitleBatchResult]  # Same order as the request
@@ -0,0 +1,113 @@
+import io
+import re
+import wave
+from typing import List, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000  # Whisper's native rate; everything is decoded to 16 kHz mono int16
+FRAME_MS = 30
+
+_WORD_RE = re.compile(r"[\w']+")
+
+
+def frame_rms(samples: np.ndarray, frame_len: int) -> np.ndarray:
+    """RMS energy per non-overlapping frame of frame_len samples."""
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    rms = np.empty(n_frames, dtype=np.float32)
+    # Blockwise so a memory-mapped hour of audio isn't converted to float all at once
+    block = 10_000
+    for first in range(0, n_frames, block):
+        last = min(n_frames, first + block)
+        frames = np.asarray(samples[first * frame_len:last * frame_len], dtype=np.float32).reshape(-1, frame_len)
+        rms[first:last] = np.sqrt(np.mean(frames * frames, axis=1))
+    return rms
+
+
+def trim_silence(samples: np.ndarray, sample_rate: int, floor: float, relative: float,
+                 padding_seconds: float) -> Tuple[int, int]:
+    """
+    Returns the [start, end) range between the first and last non-silent
+    frame, padded on both sides. (0, 0) means all silence.
+
+    A frame is silent below `relative` times the clip's loudest frame RMS,
+    so quiet recordings keep their speech; `floor` (int16 RMS) is the
+    absolute level under which a frame is always silent.
+    """
+    frame_len = max(1, sample_rate * FRAME_MS // 1000)
+    rms = frame_rms(samples, frame_len)
+    if len(rms) == 0:
+        return 0, len(samples)
+    threshold = max(floor, relative * float(rms.max()))
+    loud = np.flatnonzero(rms > threshold)
+    if len(loud) == 0:
+        return 0, 0
+    padding = int(padding_seconds * sample_rate)
+    start = max(0, int(loud[0]) * frame_len - padding)
+    end = min(len(samples), (int(loud[-1]) + 1) * frame_len + padding)
+    return start, end
+
+
+def plan_segments(samples: np.ndarray, sample_rate: int, segment_seconds: float,
+                  overlap_seconds: float, search_seconds: float) -> List[Tuple[int, int]]:
+    """
+    Splits audio into [start, end) sample ranges of at most segment_seconds.
+    Each cut lands on the quietest frame within the last search_seconds of the
+    segment, and the next segment starts overlap_seconds before that cut so
+    words on the boundary are heard by both requests.
+    """
+    total = len(samples)
+    seg_len = int(segment_seconds * sample_rate)
+    if total <= seg_len:
+        return [(0, total)]
+
+    frame_len = max(1, sample_rate * FRAME_MS // 1000)
+    overlap = int(overlap_seconds * sample_rate)
+    search = int(search_seconds * sample_rate)
+    rms = frame_rms(samples, frame_len)
+
+    segments = []
+    start = 0
+    while total - start > seg_len:
+        target = start + seg_len
+        lo = max(target - search, start + overlap + frame_len)
+        f_lo, f_hi = lo // frame_len, max(lo // frame_len + 1, target // frame_len)
+        window = rms[f_lo:f_hi]
+        cut = (f_lo + int(np.argmin(window))) * frame_len + frame_len // 2 if len(window) else target
+        segments.append((start, cut))
+        start = max(cut - overlap, start + 1)
+    segments.append((start, total))
+    return segments
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.asarray(samples, dtype="<i2").tobytes())
+    return buffer.getvalue()
+
+
+def _norm_words(text: str) -> List[str]:
+    return [w.lower() for w in _WORD_RE.findall(text)]
+
+
+def drop_overlap(previous: str, current: str, max_words: int = 20) -> str:
+    """
+    Removes the words at the start of `current` that repeat the end of
+    `previous` (the audio both segments share). Needs a run of at least two
+    words to avoid eating a legitimately repeated "the".
+    """
+    prev_words = _norm_words(previous)[-max_words:]
+    tokens = list(re.finditer(r"\S+", current))
+    cur_words = [_norm_words(t.group()) for t in tokens[:max_words]]
+    cur_flat = [w[0] if w else "" for w in cur_words]
+
+    for k in range(min(len(prev_words), len(cur_flat)), 1, -1):
+        if prev_words[-k:] == cur_flat[:k]:
+            return current[tokens[k - 1].end():].lstrip() if k < len(tokens) else ""
+    return current.strip()
@@ -0,0 +1,196 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from ..core.config import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.error")
+
+_BLOB_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+_DATA_URI_RE = re.compile(r"^data:image/[\w.+-]+;base64,(.+)$", re.DOTALL)
+
+# Magic bytes -> (extension, media type)
+_SIGNATURES = [
+    (b"\xff\xd8\xff", ("jpg", "image/jpeg")),
+    (b"\x89PNG\r\n\x1a\n", ("png", "image/png")),
+    (b"GIF8", ("gif", "image/gif")),
+    (b"RIFF", ("webp", "image/webp")),
+]
+_MEDIA_TYPES = {ext: media for _, (ext, media) in _SIGNATURES}
+
+
+def sniff_image_type(data: bytes) -> Tuple[str, str]:
+    for magic, kind in _SIGNATURES:
+        if data.startswith(magic):
+            return kind
+    return "bin", "application/octet-stream"
+
+
+def decode_data_uri(uri: str) -> Optional[bytes]:
+    """Bytes of a base64 `data:image/...` URI, or None if it isn't one."""
+    match = _DATA_URI_RE.match(uri or "")
+    if not match:
+        return None
+    try:
+        return base64.b64decode(match.group(1), validate=False)
+    except (binascii.Error, ValueError):
+        return None
+
+
+class BlobStore:
+    """
+    Local content-addressed store for generated and uploaded images.
+    Blobs are keyed by SHA-256, written once, and evicted least-recently-used
+    first once the store grows past max_bytes.
+    """
+
+    def __init__(self, root: str, max_bytes: int, url_prefix: str):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.url_prefix = url_prefix.rstrip("/")
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evictions = 0
+
+        os.makedirs(self.root, exist_ok=True)
+        for _, _, files in os.walk(self.root):
+            for name in files:
+                path = self._path_for_name(name)
+                try:
+                    if name.endswith(".tmp"):
+                        os.remove(path)  # Left behind by an interrupted write
+                    else:
+                        self.total_bytes += os.path.getsize(path)
+                except OSError:
+                    pass
+
+    def _path_for_name(self, name: str) -> str:
+        return os.path.join(self.root, name[:2], name)
+
+    def _find(self, blob_id: str) -> Optional[str]:
+        # Only final names ("<sha>.<ext>"); in-flight "<sha>.<ext>.<pid>.tmp" files never match
+        for ext in (*_MEDIA_TYPES, "bin"):
+            path = self._path_for_name(f"{blob_id}.{ext}")
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def put(self, data: bytes) -> str:
+        """Stores data (once) and returns its blob id."""
+        blob_id = hashlib.sha256(data).hexdigest()
+        ext, _ = sniff_image_type(data)
+        path = self._path_for_name(f"{blob_id}.{ext}")
+
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path)  # Refresh recency
+                return blob_id
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self.total_bytes += len(data)
+            self._evict_if_needed(keep=path)
+
+        return blob_id
+
+    def get(self, blob_id: str) -> Optional[Tuple[str, str]]:
+        """Returns (path, media_type) for a stored blob, or None."""
+        if not _BLOB_ID_RE.match(blob_id or ""):
+            return None
+        path = self._find(blob_id)
+        if path is None:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        ext = path.rsplit(".", 1)[-1]
+        return path, _MEDIA_TYPES.get(ext, "application/octet-stream")
+
+    # Disk I/O runs in a worker thread so callers on the event loop don't block
+
+    async def aput(self, data: bytes) -> str:
+        return await asyncio.to_thread(self.put, data)
+
+    async def aget(self, blob_id: str) -> Optional[Tuple[str, str]]:
+        return await asyncio.to_thread(self.get, blob_id)
+
+    def url_for(self, blob_id: str) -> str:
+        return f"{self.url_prefix}/{blob_id}"
+
+    def blob_id_for(self, url: str) -> Optional[str]:
+        """The blob id if `url` points into this store."""
+        if not (url or "").startswith(self.url_prefix + "/"):
+            return None
+        blob_id = url[len(self.url_prefix) + 1:]
+        return blob_id if _BLOB_ID_RE.match(blob_id) else None
+
+    def read_data_uri(self, blob_id: str) -> Optional[str]:
+        """A stored blob as a data URI (for model APIs that can't reach this store), or None."""
+        found = self.get(blob_id)
+        if found is None:
+            return None
+        path, media_type = found
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        return f"data:{media_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+    async def astore_images(self, images: List[str]) -> List[str]:
+        """Writes uploaded data-URI images to the store; returns their short URLs (other URLs unchanged)."""
+        stored = []
+        for image in images:
+            data = decode_data_uri(image)
+            stored.append(self.url_for(await self.aput(data)) if data else image)
+        return stored
+
+    def _evict_if_needed(self, keep: str):
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        entries = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                if path == keep or name.endswith(".tmp"):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+        for _, size, path in sorted(entries):
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.total_bytes -= size
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {"total_bytes": self.total_bytes, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+
+@lru_cache()
+def get_blob_store() -> BlobStore:
+    settings: Settings = get_settings()
+    return BlobStore(
+        settings.IMAGE_STORE_PATH,
+        settings.IMAGE_STORE_MAX_BYTES,
+        url_prefix=f"{settings.API_PREFIX}/images",
+    )
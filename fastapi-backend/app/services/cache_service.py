@@ -0,0 +1,197 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..core.config import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# Freshness policy (seconds) per tool. News goes stale fast, transcripts don't.
+DEFAULT_TTLS: Dict[str, int] = {
+    "google_search": 10 * 60,
+    "search_youtube": 60 * 60,
+    "get_video_details": 6 * 60 * 60,
+    "get_video_transcript": 7 * 24 * 60 * 60,
+    "transcribe_audio": 30 * 24 * 60 * 60,
+    "chat_title": 30 * 24 * 60 * 60,
+    "image_caption": 30 * 24 * 60 * 60,
+    "image_caption_failed": 10 * 60,  # Retry backoff after a failed caption
+}
+
+# Free-text arguments: case and spacing don't change the result. Everything
+# else (video IDs, URLs, digests) is case-sensitive and used verbatim.
+TEXT_ARGS = {"query"}
+
+# Bumped when the key format changes, so entries under old keys are never served
+KEY_VERSION = 2
+
+_MISSING = object()
+
+
+class ToolResultCache:
+    """
+    Two-tier cache for tool results: an in-memory LRU with TTL in front of
+    an on-disk SQLite tier. Keys are the tool name plus normalized arguments.
+    Async callers use aget/aset, which run the disk tier in a worker thread.
+    """
+
+    def __init__(self, db_path: Optional[str], max_items: int = 512, ttls: Optional[Dict[str, int]] = None):
+        self.max_items = max_items
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = 10 * 60
+
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS tool_cache ("
+                    "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"[ToolCache] Disk tier disabled: {e}")
+                self._db = None
+
+    # --- Keys ---
+
+    @staticmethod
+    def _normalize(value: Any, text: bool = False) -> Any:
+        if isinstance(value, str):
+            return " ".join(value.lower().split()) if text else value
+        if isinstance(value, dict):
+            return {k: ToolResultCache._normalize(v, k in TEXT_ARGS) for k, v in sorted(value.items())}
+        if isinstance(value, (list, tuple)):
+            return [ToolResultCache._normalize(v, text) for v in value]
+        return value
+
+    def make_key(self, tool: str, args: Dict[str, Any]) -> str:
+        return f"{tool}:v{KEY_VERSION}:{json.dumps(self._normalize(args), sort_keys=True, ensure_ascii=False)}"
+
+    # --- Lookup / Store ---
+
+    def get(self, tool: str, args: Dict[str, Any]) -> Any:
+        """Returns the cached value or the module-level _MISSING sentinel."""
+        key = self.make_key(tool, args)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self.counters["expired"] += 1
+
+            if self._db is not None:
+                # Any disk-tier failure (locked, read-only, corrupt row) is just a miss
+                try:
+                    row = self._db.execute(
+                        "SELECT expires_at, value FROM tool_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        expires_at, raw = row
+                        if expires_at > now:
+                            value = json.loads(raw)
+                            self._put_memory(key, expires_at, value)
+                            self.counters["disk_hits"] += 1
+                            return value
+                        self.counters["expired"] += 1
+                        self._db.execute("DELETE FROM tool_cache WHERE key = ?", (key,))
+                        self._db.commit()
+                except (sqlite3.Error, ValueError) as e:
+                    logger.error(f"[ToolCache] Disk read failed: {e}")
+
+            self.counters["misses"] += 1
+            return _MISSING
+
+    def set(self, tool: str, args: Dict[str, Any], value: Any):
+        key = self.make_key(tool, args)
+        expires_at = time.time() + self.ttls.get(tool, self.default_ttl)
+
+        with self._lock:
+            self._put_memory(key, expires_at, value)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO tool_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                        (key, expires_at, json.dumps(value)),
+                    )
+                    self._db.commit()
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    logger.error(f"[ToolCache] Disk write failed: {e}")
+
+    async def aget(self, tool: str, args: Dict[str, Any]) -> Any:
+        return await asyncio.to_thread(self.get, tool, args)
+
+    async def aset(self, tool: str, args: Dict[str, Any], value: Any):
+        await asyncio.to_thread(self.set, tool, args, value)
+
+    def _put_memory(self, key: str, expires_at: float, value: Any):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    # --- Helpers for services ---
+
+    def get_or_compute(self, tool: str, args: Dict[str, Any], compute: Callable[[], Any],
+                       cacheable: Callable[[Any], bool] = lambda v: True) -> Any:
+        value = self.get(tool, args)
+        if value is not _MISSING:
+            return value
+        value = compute()
+        if cacheable(value):
+            self.set(tool, args, value)
+        return value
+
+    async def aget_or_compute(self, tool: str, args: Dict[str, Any], compute: Callable[[], Awaitable[Any]],
+                              cacheable: Callable[[Any], bool] = lambda v: True) -> Any:
+        value = await self.aget(tool, args)
+        if value is not _MISSING:
+            return value
+        value = await compute()
+        if cacheable(value):
+            await self.aset(tool, args, value)
+        return value
+
+    def purge_expired(self):
+        """Drops expired rows from the disk tier."""
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute("DELETE FROM tool_cache WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self.counters)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["memory_items"] = len(self._memory)
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+@lru_cache()
+def get_tool_cache() -> ToolResultCache:
+    settings: Settings = get_settings()
+    cache = ToolResultCache(settings.TOOL_CACHE_PATH, max_items=settings.TOOL_CACHE_MEMORY_ITEMS)
+    cache.purge_expired()
+    return cache
@@ -2,21 +2,28 @@ import json
 import asyncio
 import logging
 import re
+import time
 from functools import lru_cache
-from typing import List, AsyncGenerator
+from typing import List, AsyncGenerator, Optional
 
 # [CRITICAL FIX] Added ToolMessage to imports
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
-from langchain_core.prompts.chat import ChatPromptTemplate
 
 from ..core.config import Settings, get_settings
 from ..models.chat_models import Message
 from ..core.llm_factory import get_llm_factory
 from .vector_store_service import get_vector_store_service
 from .session_manager import SessionManager
+from .context_window import ContextWindow
 from ..core.agent_graph import AgentGraphFactory
+from ..core.graph_registry import GraphRegistry
 from ..services.image_service import ImageService
 from ..services.youtube_service import YoutubeService
+from .stream_parser import AnswerStreamParser, THOUGHT, ANSWER_START, TEXT, IMAGE
+from .stream_metrics import get_cancellation_metrics
+from .vision_cache import get_vision_cache, fingerprint_images, replay_chunks
+from .title_service import get_title_generator
+from .blob_store import get_blob_store
 
 logger = logging.getLogger("uvicorn.error")
 
@@ -25,15 +32,33 @@ class ChatService:
         self.llm_factory = get_llm_factory()
         self.vector_store = get_vector_store_service()
         self.session_manager = SessionManager()
+        self.context_window = ContextWindow(self.session_manager, settings)
+        self.context_model = self.llm_factory.get_tooling_model().model_name  # Budget key for agent prompts
         self.agent_factory = AgentGraphFactory()
+        self.graph_registry = GraphRegistry(self.agent_factory)
         self.image_service = ImageService()
+        self.blob_store = get_blob_store()
         self.youtube_service = YoutubeService()
+        self.cancellation_metrics = get_cancellation_metrics()
+        self.vision_cache = get_vision_cache()
+        self.title_generator = get_title_generator()
+        self.image_concurrency = settings.IMAGE_GENERATION_CONCURRENCY
 
     async def get_chat_history(self, session_id: str) -> List[Message]:
         return []
 
-    async def hydrate_chat_history(self, session_id: str, messages: List[Message]):
-        self.session_manager.hydrate_history(session_id, messages)
+    async def hydrate_chat_history(self, session_id: str, messages: List[Message], replace: bool = False,
+                                   after_id: Optional[str] = None) -> dict:
+        result = self.session_manager.hydrate_history(session_id, messages, replace=replace, after_id=after_id)
+        if result["added"]:
+            # Have captions and the summary ready before the first message on this session
+            self.context_window.schedule_refresh(session_id, self.context_model)
+        return result
+
+    async def _write_through(self, session_id: str, message: str, images: List[str], ai_text: str):
+        # Uploaded images go to the content-addressed store; the session keeps their short URLs
+        stored_images = await self.blob_store.astore_images(images) if images else None
+        self.session_manager.append_turn(session_id, message, images, ai_text, stored_images=stored_images)
 
     async def stream_groq_message(
         self, 
@@ -44,7 +69,8 @@ class ChatService:
         user_context: dict = None
     ) -> AsyncGenerator[str, None]:
         
-        full_ai_response = ""
+        response_parts = []
+        turn_start = time.monotonic()
         
         # Context Prep
         aspect_ratio = "16:9"
@@ -52,41 +78,68 @@ class ChatService:
             w = user_context.get('screenWidth', 1920)
             h = user_context.get('screenHeight', 1080)
             if h > w: aspect_ratio = "9:16"
-        
-        user_info_str = ""
-        if user_context:
-            name = user_context.get('name', 'User')
-            prefs = user_context.get('preferences', {})
-            user_info_str = f"User Name: {name}. User Preferences: {json.dumps(prefs)}."
 
         # 1. Vision Path
         if images and len(images) > 0 and (not message or len(message) < 50):
             yield "__STATUS__:Analyzing Visual Content..."
             yield "__ICON__:image"
             vision_model = self.llm_factory.get_vision_model()
-            content_list = [{"type": "text", "text": message or "Analyze this image in detail."}]
+            vision_prompt = message or "Analyze this image in detail."
+
+            # Same (or near-duplicate) image with the same question: replay the cached analysis
+            fingerprints = await asyncio.to_thread(fingerprint_images, images)
+            cached = self.vision_cache.get(vision_model.model_name, vision_prompt, fingerprints, scope=session_id)
+            if cached is not None:
+                yield "__ANSWER__:"
+                for chunk in replay_chunks(cached):
+                    yield chunk
+                await self._write_through(session_id, message, images, cached)
+                self.context_window.schedule_refresh(session_id, self.context_model)
+                return
+
+            content_list = [{"type": "text", "text": vision_prompt}]
             for img in images:
                 content_list.append({"type": "image_url", "image_url": {"url": img}})
             
             user_msg = HumanMessage(content=content_list)
             yield "__ANSWER__:" 
-            async for chunk in vision_model.astream([user_msg]):
-                if chunk.content:
-                    full_ai_response += chunk.content
-                    yield chunk.content
+            try:
+                async for chunk in vision_model.astream([user_msg]):
+                    if chunk.content:
+                        response_parts.append(chunk.content)
+                        yield chunk.content
+            except (asyncio.CancelledError, GeneratorExit):
+                self.cancellation_metrics.record_cancelled(len(response_parts), time.monotonic() - turn_start)
+                raise
+            self.cancellation_metrics.record_completed(len(response_parts), time.monotonic() - turn_start)
+            self.vision_cache.set(
+                vision_model.model_name, vision_prompt, fingerprints, "".join(response_parts), scope=session_id
+            )
+            await self._write_through(session_id, message, images, "".join(response_parts))
+            self.context_window.schedule_refresh(session_id, self.context_model)
             return
 
         # 2. Agent Path
         yield "__STATUS__:Orchestrating Agents..."
         yield "__ICON__:logo"
         
+        turn_tokens = 0
+        speculation_slot = {}
+        image_jobs = []
+        events = None
         try:
-            graph = await self.agent_factory.create_graph()
-            history = self.session_manager.get_session_history(session_id)
+            # Shared compiled graph; per-request data rides in the config
+            graph = await self.graph_registry.get_graph()
+            graph_config = {"configurable": {
+                "language": language,
+                "user_context": user_context,
+                "aspect_ratio": aspect_ratio,
+                "speculation": speculation_slot,
+            }}
+            # Newest turns that fit the token budget, after a rolling summary of the older ones
+            history_messages = self.context_window.build(session_id, self.context_model)
             
-            # [FIX] SystemMessage is now correctly imported
             system_msg = SystemMessage(content=(
-                f"User Language: {language}. {user_info_str}\n"
                 "RULES: 1. Summarize search results. 2. Cite sources [1]. 3. Use provided web images if valid."
             ))
             
@@ -97,25 +150,103 @@ class ChatService:
             else:
                 user_msg = HumanMessage(content=message)
 
-            current_messages = [system_msg] + history.messages + [user_msg]
+            current_messages = [system_msg] + history_messages + [user_msg]
             
-            # --- STRICT STATE MACHINE VARIABLES ---
-            is_answering = False  # Have we sent the __ANSWER__ tag yet?
-            buffer = ""
-            thought_tag = "THOUGHT:"
-            pending_image_prompt = None
-            is_thought_mode = True # Start expecting a thought
-
-            async for event in graph.astream_events({"messages": current_messages}, version="v1"):
+            # --- ANSWER STREAM PARSER ---
+            parser = AnswerStreamParser()
+
+            # Images start generating as soon as their tag closes, while text keeps streaming
+            # image_jobs entries: [prompt, task, delivered, markdown]
+            image_semaphore = asyncio.Semaphore(self.image_concurrency)
+
+            async def generate_image(prompt: str) -> str:
+                async with image_semaphore:
+                    return await self.image_service.generate_image(prompt, aspect_ratio=aspect_ratio)
+
+            def launch_image(prompt: str):
+                image_jobs.append([prompt, asyncio.create_task(generate_image(prompt)), False])
+                yield "__ICON__:image"
+                yield f"__THOUGHT__: Generating visual: {prompt}"
+                yield "__SKELETON_START__:"
+                if parser.answering:
+                    yield "__ANSWER__:"  # Back to answer mode for the text that follows
+
+            def deliver_ready_images():
+                for job in image_jobs:
+                    task, delivered = job[1], job[2]
+                    if delivered or not task.done():
+                        continue
+                    job[2] = True
+                    try:
+                        img_markdown = task.result()
+                    except Exception as e:
+                        img_markdown = f"Image generation failed: {e}"
+                    job.append(img_markdown)
+                    yield "__SKELETON_END__:"
+                    yield f"\n{img_markdown}\n"
+
+            # Speculative general tokens are held until the supervisor decides
+            speculation = "pending"  # pending | accepted | rejected
+            speculative_chunks = []
+
+            def render(events):
+                for ev in events:
+                    if ev.kind == THOUGHT:
+                        yield f"__THOUGHT__:{ev.value}"
+                    elif ev.kind == ANSWER_START:
+                        yield "__ANSWER__:"
+                    elif ev.kind == TEXT:
+                        yield ev.value
+                    elif ev.kind == IMAGE:
+                        yield from launch_image(ev.value)  # Tag is hidden from the stream
+
+            def consume_text(text_chunk: str):
+                response_parts.append(text_chunk)
+                yield from render(parser.feed(text_chunk))
+
+            def start_answer():
+                """Opens the answer section for output that doesn't come from the LLM stream."""
+                if parser.answering:
+                    return
+                yield "__ANSWER__:"
+                yield from render(parser.force_answer())
+
+            # v2 cancels the graph run when this generator is closed (client disconnect)
+            events = graph.astream_events({"messages": current_messages}, config=graph_config, version="v2")
+            async for event in events:
+                for out in deliver_ready_images():
+                    yield out
+
                 kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    turn_tokens += 1
                 metadata = event.get("metadata") or {} 
                 node_name = metadata.get("langgraph_node", "")
                 name = event.get("name", "")
 
                 # A. Supervisor Logic
-                if kind == "on_chat_model_stream" and node_name == "supervisor":
+                if kind == "on_chat_model_stream" and metadata.get("speculative"):
+                    chunk = event["data"]["chunk"]
+                    if chunk.content:
+                        if speculation == "pending":
+                            speculative_chunks.append(chunk.content)
+                        elif speculation == "accepted":
+                            for out in consume_text(chunk.content):
+                                yield out
+
+                elif kind == "on_chat_model_stream" and node_name == "supervisor":
                     pass
 
+                elif kind == "on_chain_end" and node_name == "supervisor" and speculation == "pending":
+                    output = event["data"].get("output")
+                    if isinstance(output, dict) and "next_agent" in output:
+                        speculation = "accepted" if output["next_agent"] == "general" else "rejected"
+                        if speculation == "accepted":
+                            for text_chunk in speculative_chunks:
+                                for out in consume_text(text_chunk):
+                                    yield out
+                        speculative_chunks = []
+
                 # B. Agent Status & Icons
                 elif kind == "on_chain_start" and node_name in ["researcher", "coder", "artist", "visionary", "general"]:
                     agent_display = node_name.capitalize()
@@ -144,12 +275,10 @@ class ChatService:
                 elif kind == "on_tool_end" and name == "generate_image":
                      yield "__SKELETON_END__:"
                      image_markdown = event["data"].get("output", "")
-                     if "data:image" in image_markdown:
-                         if not is_answering:
-                             yield "__ANSWER__:"
-                             is_answering = True
+                     if str(image_markdown).startswith("![Generated Image]("):
+                         for out in start_answer(): yield out
                          yield f"\n{image_markdown}\n"
-                         full_ai_response += image_markdown
+                         response_parts.append(image_markdown)
 
                 # D. Researcher Output (Log Thoughts & Sources)
                 elif kind == "on_chain_end" and node_name == "researcher":
@@ -202,95 +331,31 @@ class ChatService:
                                     yield f"__THOUGHT__:{thought_part}"
                                     rest = content.replace(f"THOUGHT: {thought_part}", "").replace("THOUGHT:", "").strip()
                                     if rest:
-                                        if not is_answering:
-                                            yield "__ANSWER__:"
-                                            is_answering = True
+                                        for out in start_answer(): yield out
                                         yield f"\n{rest}\n"
-                                        full_ai_response += rest
+                                        response_parts.append(rest)
                     except: pass
 
                 # F. GENERAL ANSWER STREAMING
                 elif kind == "on_chat_model_stream" and node_name != "supervisor":
                     chunk = event["data"]["chunk"]
                     if chunk.content:
-                        text_chunk = chunk.content
-                        full_ai_response += text_chunk
-                        buffer += text_chunk
-
-                        # --- STATE MACHINE ---
-                        if is_answering:
-                            # 1. ANSWER MODE: Stream text, hide Image Tags
-                            if "[[" in buffer:
-                                if "]]" in buffer:
-                                    match = re.search(r'\[\[GENERATE_IMAGE:\s*(.*?)\]\]', buffer)
-                                    if match:
-                                        pending_image_prompt = match.group(1)
-                                        buffer = buffer.replace(match.group(0), "")
-                                    yield buffer
-                                    buffer = ""
-                            else:
-                                yield buffer
-                                buffer = ""
-                        else:
-                            # 2. THOUGHT MODE: Wait for THOUGHT: line to finish
-                            clean_buffer = buffer.lstrip()
-                            
-                            # Check if it *could* be a thought
-                            if thought_tag.startswith(clean_buffer) or clean_buffer.startswith(thought_tag):
-                                # If we have the full tag "THOUGHT:"
-                                if clean_buffer.startswith(thought_tag):
-                                    if "\n" in buffer:
-                                        # Found end of thought line
-                                        split_idx = buffer.find("\n") + 1
-                                        thought_line = buffer[:split_idx].strip()
-                                        remaining = buffer[split_idx:]
-                                        
-                                        # Emit Thought
-                                        clean_thought = thought_line.replace(thought_tag, "").strip()
-                                        yield f"__THOUGHT__:{clean_thought}"
-                                        
-                                        # Switch to Answer
-                                        yield "__ANSWER__:"
-                                        is_answering = True
-                                        buffer = remaining # Process remainder in next loop or flush
-                                        
-                                        # If text remains, flush it immediately
-                                        if buffer.strip():
-                                            yield buffer
-                                            buffer = ""
-                                    # Else wait for newline
-                                else:
-                                    # Buffer is shorter than "THOUGHT:", wait for more data
-                                    if len(clean_buffer) > len(thought_tag):
-                                         # Started with "T..." but mismatch. Answer.
-                                         yield "__ANSWER__:"
-                                         is_answering = True
-                                         yield buffer
-                                         buffer = ""
-                            else:
-                                # Not a thought. Answer immediately.
-                                yield "__ANSWER__:"
-                                is_answering = True
-                                yield buffer
-                                buffer = ""
+                        for out in consume_text(chunk.content):
+                            yield out
 
             # --- END OF STREAM ---
-            if buffer:
-                if not is_answering:
-                    yield "__ANSWER__:"
-                yield buffer
+            for out in render(parser.finish()):
+                yield out
+            full_ai_response = "".join(response_parts)
 
-            # Post-Process Image
-            if pending_image_prompt:
-                yield "__ICON__:image"
-                yield f"__THOUGHT__: Generating visual: {pending_image_prompt}"
-                yield "__SKELETON_START__:"
-                img_markdown = await self.image_service.generate_image(pending_image_prompt, aspect_ratio=aspect_ratio)
-                yield "__SKELETON_END__:"
-                yield f"\n{img_markdown}\n"
-                
-                clean_tag = f"[[GENERATE_IMAGE: {pending_image_prompt}]]"
-                full_ai_response = full_ai_response.replace(clean_tag, img_markdown)
+            # Deliver the remaining images as they resolve
+            while any(not job[2] for job in image_jobs):
+                await asyncio.wait([job[1] for job in image_jobs if not job[2]], return_when=asyncio.FIRST_COMPLETED)
+                for out in deliver_ready_images():
+                    yield out
+
+            for job in image_jobs:
+                full_ai_response = full_ai_response.replace(f"[[GENERATE_IMAGE: {job[0]}]]", job[3])
 
             # Save Memory
             if full_ai_response.strip() and len(full_ai_response) > 20:
@@ -298,34 +363,39 @@ class ChatService:
                 clean_memory = re.sub(r'\[\[GENERATE_IMAGE:.*?\]\]', '', clean_memory)
                 asyncio.create_task(self.vector_store.add_documents([f"User: {message}\nUltron: {clean_memory}"]))
 
+            # Write the finished turn through to the session so the next request sees it
+            await self._write_through(
+                session_id, message, images, re.sub(r'\[\[GENERATE_IMAGE:.*?\]\]', '', full_ai_response)
+            )
+            # Caption this turn's images and fold whatever fell out of the window into the summary, off the critical path
+            self.context_window.schedule_refresh(session_id, self.context_model)
+
+            self.cancellation_metrics.record_completed(turn_tokens, time.monotonic() - turn_start)
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client went away: stop the graph, tools and any background work
+            logger.info(f"Stream cancelled by client after {turn_tokens} tokens")
+            self.cancellation_metrics.record_cancelled(turn_tokens, time.monotonic() - turn_start)
+            raise
         except Exception as e:
             logger.error(f"Graph Error: {e}")
             yield "__ANSWER__:" 
             yield f"\n[System Error]: {str(e)}"
+        finally:
+            if events is not None:
+                await events.aclose()
+            task = speculation_slot.get("task")
+            if task is not None and not task.done():
+                task.cancel()
+            for job in image_jobs:
+                if not job[1].done():
+                    job[1].cancel()
 
     async def generate_chat_title(self, messages: List[Message]) -> str:
-        try:
-            text_parts = []
-            for msg in messages[-4:]: 
-                for item in msg.content:
-                    if item.type == 'text': 
-                        text_parts.append(item.value)
-            
-            conversation_summary = " ".join(text_parts)[:1000]
-            if not conversation_summary: return "New Chat"
-
-            model = self.llm_factory.get_tooling_model()
-            title_prompt = ChatPromptTemplate.from_messages([
-                ("system", "Generate a 3-5 word title for this chat, max words should be 10. No quotes."),
-                ("user", "{context}")
-            ])
-            
-            chain = title_prompt | model
-            response = await chain.ainvoke({"context": conversation_summary})
-            return response.content[:100].strip().replace('"', '')
-        except Exception as e:
-            print(f"Error generating title: {e}")
-            return "New Chat"
+        return await self.title_generator.generate(messages)
+
+    async def generate_chat_titles(self, conversations: List[List[Message]]) -> List[str]:
+        return await self.title_generator.generate_many(conversations)
 
 @lru_cache()
 def get_chat_service() -> ChatService:
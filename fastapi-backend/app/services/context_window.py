@@ -0,0 +1,285 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from ..core.config import Settings
+from ..core.llm_factory import get_llm_factory
+from .image_captions import get_image_captioner, image_urls
+from .session_store import message_bytes
+
+logger = logging.getLogger("uvicorn.error")
+
+MESSAGE_OVERHEAD_TOKENS = 4  # Role + separators
+IMAGE_TOKENS = 1024  # Rough cost of one image part on the vision-capable models
+SUMMARY_INPUT_CHARS = 2000  # Per message, when folding it into the summary
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def message_tokens(message: BaseMessage) -> int:
+    content = message.content
+    if isinstance(content, str):
+        return MESSAGE_OVERHEAD_TOKENS + estimate_tokens(content)
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    for block in content:
+        if isinstance(block, str):
+            tokens += estimate_tokens(block)
+        elif block.get("type") == "image_url":
+            tokens += IMAGE_TOKENS
+        else:
+            tokens += estimate_tokens(block.get("text", ""))
+    return tokens
+
+
+def message_text(message: BaseMessage, limit: int = SUMMARY_INPUT_CHARS) -> str:
+    content = message.content
+    if isinstance(content, str):
+        text = content
+    else:
+        parts = []
+        for block in content:
+            if isinstance(block, str):
+                parts.append(block)
+            elif block.get("type") == "image_url":
+                parts.append("[image]")
+            else:
+                parts.append(block.get("text", ""))
+        text = " ".join(parts)
+    return text if len(text) <= limit else text[:limit] + " ..."
+
+
+def summary_message(summary: Dict[str, Any]) -> SystemMessage:
+    return SystemMessage(content=f"Summary of the earlier conversation:\n{summary['text']}")
+
+
+def elide_images(messages: List[BaseMessage], captions: Dict[str, str]) -> Tuple[List[BaseMessage], int]:
+    """
+    Copies of `messages` with every image part replaced by a text part holding
+    its caption (`captions` maps URL -> caption). Returns (messages, images elided).
+    """
+    out, elided = [], 0
+    for message in messages:
+        if isinstance(message.content, str) or not any(
+            isinstance(b, dict) and b.get("type") == "image_url" for b in message.content
+        ):
+            out.append(message)
+            continue
+        blocks = []
+        for block in message.content:
+            if isinstance(block, dict) and block.get("type") == "image_url":
+                image_url = block.get("image_url")
+                url = image_url.get("url") if isinstance(image_url, dict) else image_url
+                caption = captions.get(url)
+                blocks.append({"type": "text", "text": f"[Image: {caption}]" if caption else "[Image shared earlier]"})
+                elided += 1
+            else:
+                blocks.append(block)
+        out.append(message.model_copy(update={"content": blocks}))
+    return out, elided
+
+
+def _turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Splits history into turns: a user message plus everything up to the next one."""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def select_window(messages: List[BaseMessage], budget: int) -> Tuple[int, int]:
+    """
+    Fills the token budget with whole turns, newest first.
+    Returns (start, tokens): messages[start:] is the window.
+    """
+    start, used = len(messages), 0
+    for turn in reversed(_turns(messages)):
+        cost = sum(message_tokens(m) for m in turn)
+        if used + cost > budget:
+            break
+        used += cost
+        start -= len(turn)
+    return start, used
+
+
+class ContextWindow:
+    """
+    Token-budgeted prompt history with a rolling summary.
+
+    The newest turns that fit the model's budget go to the LLM, with past
+    images replaced by their captions; older turns are folded into a
+    summary stored with the session. Captions and the summary are computed
+    in the background after each turn, so building the prompt never waits
+    on them.
+    """
+
+    def __init__(self, session_manager, settings: Settings):
+        self.session_manager = session_manager
+        self.default_budget = settings.CONTEXT_TOKEN_BUDGET
+        self.model_budgets = settings.CONTEXT_MODEL_TOKEN_BUDGETS
+        self.summary_budget = settings.CONTEXT_SUMMARY_TOKEN_BUDGET
+        self.llm_factory = get_llm_factory()
+        self.captioner = get_image_captioner()
+        self._chain = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._dirty: set = set()
+        self.counters = {"builds": 0, "history_tokens": 0, "messages_dropped": 0,
+                         "images_elided": 0, "bytes_saved": 0, "tokens_saved": 0,
+                         "summaries": 0, "summary_failures": 0, "summary_discarded": 0,
+                         "summary_seconds": 0.0}
+
+        self.summary_prompt = ChatPromptTemplate.from_messages([
+            ("system", """
+            You maintain the running summary of a conversation between a user and an AI assistant.
+            Merge the new messages into the existing summary.
+            - Keep facts, decisions, names, numbers, code identifiers and open questions.
+            - Drop greetings and filler.
+            - Stay under {max_words} words. Do NOT explain, ONLY return the summary.
+            """),
+            ("human", "Existing summary:\n{summary}\n\nNew messages:\n{messages}")
+        ])
+
+    def budget_for(self, model_name: str) -> int:
+        return self.model_budgets.get(model_name, self.default_budget)
+
+    # --- Prompt assembly ---
+
+    def _captioned(self, session_id: str, messages: List[BaseMessage]) -> Tuple[List[BaseMessage], int]:
+        urls = image_urls(messages)
+        if not urls:
+            return messages, 0
+        captions = self.captioner.captions_for(session_id, urls)
+        self.captioner.schedule(u for u in urls if u not in captions)  # Ready by the next turn
+        return elide_images(messages, captions)
+
+    def build(self, session_id: str, model_name: str) -> List[BaseMessage]:
+        """
+        History for the next prompt: [summary] + the newest turns that fit the
+        budget, with images as captions. The current turn's images are not
+        part of the history and still go to the model as pixels.
+        """
+        original = list(self.session_manager.get_session_history(session_id).messages)
+        messages, _ = self._captioned(session_id, original)
+        summary = self.session_manager.get_summary(session_id)
+        budget = self.budget_for(model_name)
+
+        prefix: List[BaseMessage] = []
+        if summary and summary.get("text"):
+            summary_msg = summary_message(summary)
+            budget -= message_tokens(summary_msg)
+            prefix.append(summary_msg)
+
+        start, used = select_window(messages, max(0, budget))
+        self.counters["builds"] += 1
+        self.counters["history_tokens"] += used
+        self.counters["messages_dropped"] += start
+
+        # What eliding past images saved on the messages actually sent this turn
+        elided = len(image_urls(original[start:]))
+        if elided:
+            bytes_saved = sum(message_bytes(m) for m in original[start:]) - sum(message_bytes(m) for m in messages[start:])
+            tokens_saved = sum(message_tokens(m) for m in original[start:]) - used
+            self.counters["images_elided"] += elided
+            self.counters["bytes_saved"] += bytes_saved
+            self.counters["tokens_saved"] += tokens_saved
+            logger.info(f"[Context] {session_id}: {elided} past images sent as captions, "
+                        f"saved {bytes_saved} bytes / ~{tokens_saved} tokens")
+        return prefix + messages[start:]
+
+    # --- Background refresh ---
+
+    def schedule_refresh(self, session_id: str, model_name: str):
+        """
+        After the session's history changed: captions for any new images, and
+        a summary refresh (coalesced per session). Both run in the background.
+        """
+        urls = image_urls(self.session_manager.get_session_history(session_id).messages)
+        captions = self.captioner.captions_for(session_id, urls)
+        self.captioner.schedule(u for u in urls if u not in captions)
+        task = self._tasks.get(session_id)
+        if task is not None and not task.done():
+            self._dirty.add(session_id)  # Runs again once the current refresh finishes
+            return
+        self._tasks[session_id] = asyncio.create_task(self._refresh_loop(session_id, model_name))
+
+    async def _refresh_loop(self, session_id: str, model_name: str):
+        try:
+            while True:
+                self._dirty.discard(session_id)
+                await self.refresh_summary(session_id, model_name)
+                if session_id not in self._dirty:
+                    break
+        finally:
+            self._tasks.pop(session_id, None)
+
+    async def refresh_summary(self, session_id: str, model_name: str) -> bool:
+        """Folds turns that no longer fit the window into the summary. Returns True if it changed."""
+        messages, _ = self._captioned(session_id, list(self.session_manager.get_session_history(session_id).messages))
+        summary = self.session_manager.get_summary(session_id) or {}
+
+        # Same budget maths as build(), with the current summary's cost reserved
+        budget = self.budget_for(model_name)
+        if summary.get("text"):
+            budget -= message_tokens(summary_message(summary))
+        start, _ = select_window(messages, max(0, budget))
+
+        # Only fold what the summary doesn't cover yet
+        ids = [m.id for m in messages]
+        covered = summary.get("covered_id")
+        dropped = messages[ids.index(covered) + 1 if covered in ids else 0:start]
+        if not dropped:
+            return False
+
+        transcript = "\n".join(
+            f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {message_text(m)}" for m in dropped
+        )
+        started = time.monotonic()
+        try:
+            if self._chain is None:
+                self._chain = self.summary_prompt | self.llm_factory.get_tooling_model() | StrOutputParser()
+            text = await self._chain.ainvoke({
+                "summary": summary.get("text") or "(none)",
+                "messages": transcript,
+                "max_words": int(self.summary_budget * 0.75),
+            })
+        except Exception as e:
+            logger.error(f"[Context] Summary refresh failed for {session_id}: {e}")
+            self.counters["summary_failures"] += 1
+            return False
+
+        # The history may have been rebuilt (or summarized elsewhere) while the LLM ran
+        current_ids = {m.id for m in self.session_manager.get_session_history(session_id).messages}
+        if dropped[-1].id not in current_ids or (self.session_manager.get_summary(session_id) or {}) != summary:
+            logger.info(f"[Context] {session_id}: history changed during summary refresh, result dropped")
+            self.counters["summary_discarded"] += 1
+            return False
+
+        self.session_manager.set_summary(session_id, {"text": text.strip(), "covered_id": dropped[-1].id})
+        self.counters["summaries"] += 1
+        self.counters["summary_seconds"] += time.monotonic() - started
+        return True
+
+    async def aclose(self):
+        tasks = [t for t in self._tasks.values() if not t.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.captioner.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.counters)
+        builds = stats["builds"]
+        stats["avg_history_tokens"] = round(stats["history_tokens"] / builds, 1) if builds else 0.0
+        stats["summary_seconds"] = round(stats["summary_seconds"], 3)
+        stats["pending_summaries"] = sum(1 for t in self._tasks.values() if not t.done())
+        stats["captions"] = self.captioner.stats()
+        return stats
@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from ..core.config import Settings, get_settings
+from ..core.llm_factory import get_llm_factory
+from .blob_store import get_blob_store
+from .cache_service import _MISSING, get_tool_cache
+
+logger = logging.getLogger("uvicorn.error")
+
+CACHE_TOOL = "image_caption"
+FAILED_CACHE_TOOL = "image_caption_failed"
+MEMO_SESSIONS = 512  # Sessions whose resolved captions are kept in memory
+CAPTION_PROMPT = (
+    "Describe this image in one or two sentences for someone who can't see it. "
+    "Mention any visible text, code, numbers or charts. No preamble."
+)
+MAX_CAPTION_CHARS = 400
+
+
+def image_key(image_url: str) -> str:
+    return hashlib.sha1(image_url.encode("utf-8")).hexdigest()
+
+
+def image_urls(messages: Iterable[BaseMessage]) -> List[str]:
+    """Image URLs in LangChain message content blocks, in order."""
+    urls = []
+    for message in messages:
+        if isinstance(message.content, str):
+            continue
+        for block in message.content:
+            if isinstance(block, dict) and block.get("type") == "image_url":
+                image_url = block.get("image_url")
+                url = image_url.get("url") if isinstance(image_url, dict) else image_url
+                if url:
+                    urls.append(url)
+    return urls
+
+
+def _captionable(image_url: str) -> bool:
+    return image_url.startswith(("data:image/", "http://", "https://"))
+
+
+class ImageCaptioner:
+    """
+    One short caption per image, generated once in the background and kept
+    in the shared tool cache. Past images in a prompt are replaced by their
+    caption, so only the current turn's images are sent as pixels.
+
+    Captions a session has already resolved are memoized per session, so
+    building a prompt doesn't hit the cache for every past image each turn.
+    A failed image is marked for a short TTL and not retried until it expires.
+    """
+
+    def __init__(self, settings: Settings):
+        self.llm_factory = get_llm_factory()
+        self.cache = get_tool_cache()
+        self.blob_store = get_blob_store()
+        self.semaphore = asyncio.Semaphore(max(1, settings.IMAGE_CAPTION_CONCURRENCY))
+        self._model = None
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._memo: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._retry_at: Dict[str, float] = {}
+        self.counters = {"generated": 0, "failed": 0, "hits": 0, "misses": 0, "memo_hits": 0, "backoff_skips": 0}
+
+    def caption_for(self, image_url: str) -> Optional[str]:
+        cached = self.cache.get(CACHE_TOOL, {"image": image_key(image_url)})
+        if cached is _MISSING:
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        return cached
+
+    def captions_for(self, session_id: str, urls: Iterable[str]) -> Dict[str, str]:
+        """URL -> caption for the session's images that have one."""
+        memo = self._memo.get(session_id)
+        if memo is None:
+            memo = self._memo[session_id] = {}
+        self._memo.move_to_end(session_id)
+        while len(self._memo) > MEMO_SESSIONS:
+            self._memo.popitem(last=False)
+
+        for url in dict.fromkeys(urls):
+            if url in memo:
+                self.counters["memo_hits"] += 1
+                continue
+            key = image_key(url)
+            if key in self._pending or self._backing_off(key):
+                self.counters["misses"] += 1  # Nothing to look up until the task or backoff ends
+                continue
+            caption = self.caption_for(url)
+            if caption:
+                memo[url] = caption
+        return memo
+
+    def _backing_off(self, key: str) -> bool:
+        retry_at = self._retry_at.get(key)
+        if retry_at is None:
+            return False
+        if retry_at > time.monotonic():
+            return True
+        del self._retry_at[key]
+        return False
+
+    def schedule(self, urls: Iterable[str]):
+        """Starts caption generation for images that have none yet. Never blocks."""
+        for url in urls:
+            key = image_key(url)
+            if key in self._pending or not (_captionable(url) or self.blob_store.blob_id_for(url)):
+                continue
+            if self._backing_off(key):
+                self.counters["backoff_skips"] += 1
+                continue
+            if self.cache.get(CACHE_TOOL, {"image": key}) is not _MISSING:
+                continue
+            if self.cache.get(FAILED_CACHE_TOOL, {"image": key}) is not _MISSING:
+                # Failed recently (possibly in another worker)
+                self._retry_at[key] = time.monotonic() + self.cache.ttls[FAILED_CACHE_TOOL]
+                self.counters["backoff_skips"] += 1
+                continue
+            self._pending[key] = asyncio.create_task(self._generate(key, url))
+
+    async def _generate(self, key: str, image_url: str):
+        try:
+            blob_id = self.blob_store.blob_id_for(image_url)
+            if blob_id:
+                # Our own store isn't reachable by the model API: send the pixels inline
+                image_url = await asyncio.to_thread(self.blob_store.read_data_uri, blob_id)
+                if image_url is None:
+                    raise LookupError(f"image {blob_id[:12]} is no longer in the store")
+            async with self.semaphore:
+                if self._model is None:
+                    self._model = self.llm_factory.get_vision_model()
+                response = await self._model.ainvoke([HumanMessage(content=[
+                    {"type": "text", "text": CAPTION_PROMPT},
+                    {"type": "image_url", "image_url": {"url": image_url}},
+                ])])
+            caption = " ".join(str(response.content).split())[:MAX_CAPTION_CHARS]
+            if caption:
+                await self.cache.aset(CACHE_TOOL, {"image": key}, caption)
+                self.counters["generated"] += 1
+            else:
+                await self._mark_failed(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[Captions] Caption generation failed: {e}")
+            await self._mark_failed(key)
+        finally:
+            self._pending.pop(key, None)
+
+    async def _mark_failed(self, key: str):
+        self.counters["failed"] += 1
+        now = time.monotonic()
+        if len(self._retry_at) >= MEMO_SESSIONS:
+            self._retry_at = {k: t for k, t in self._retry_at.items() if t > now}
+        self._retry_at[key] = now + self.cache.ttls[FAILED_CACHE_TOOL]
+        await self.cache.aset(FAILED_CACHE_TOOL, {"image": key}, True)
+
+    async def aclose(self):
+        tasks = [t for t in self._pending.values() if not t.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "pending": len(self._pending), "backing_off": len(self._retry_at),
+                "memo_sessions": len(self._memo)}
+
+
+@lru_cache()
+def get_image_captioner() -> ImageCaptioner:
+    return ImageCaptioner(get_settings())
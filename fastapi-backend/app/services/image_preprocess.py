@@ -0,0 +1,105 @@
+import asyncio
+import base64
+import io
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+from PIL import Image
+
+from ..core.config import get_settings
+
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_MAX_SIZE = (512, 512)
+DEFAULT_QUALITY = 70
+
+
+def _decode_base64(base64_str: str) -> bytes:
+    encoded = base64_str.split(",", 1)[1] if "," in base64_str else base64_str
+    try:
+        return base64.b64decode(encoded)
+    except Exception:
+        encoded += "=" * ((4 - len(encoded) % 4) % 4)
+        return base64.b64decode(encoded)
+
+
+def compress_base64_image(base64_str: str, max_size=DEFAULT_MAX_SIZE, quality=DEFAULT_QUALITY) -> str:
+    """
+    Decodes a base64 image, resizes it, converts to JPEG, and re-encodes.
+    Always returns a "data:image/jpeg;base64,..." URI (what the vision path expects).
+    """
+    try:
+        image_data = _decode_base64(base64_str)
+        img = Image.open(io.BytesIO(image_data))
+
+        if img.format == "JPEG":
+            # Already a small JPEG: nothing to gain from decoding and re-encoding it
+            if img.width <= max_size[0] and img.height <= max_size[1] and img.mode in ("RGB", "L"):
+                return f"data:image/jpeg;base64,{base64.b64encode(image_data).decode('utf-8')}"
+            # Let libjpeg decode at a reduced scale (1/2, 1/4, 1/8) that is still >= max_size
+            img.draft("RGB", max_size)
+
+        if img.mode in ("RGBA", "P"):
+            img = img.convert("RGB")
+
+        resample_method = getattr(Image, "Resampling", Image).LANCZOS
+        img.thumbnail(max_size, resample_method)
+
+        buffered = io.BytesIO()
+        img.save(buffered, format="JPEG", quality=quality)
+
+        new_encoded = base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+        # Return strictly as Data URI
+        return f"data:image/jpeg;base64,{new_encoded}"
+
+    except Exception as e:
+        print(f"Error compressing image: {e}")
+        if "," not in base64_str:
+             return f"data:image/jpeg;base64,{base64_str}"
+        return base64_str
+
+
+# --- Process Pool ---
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=get_settings().IMAGE_PREPROCESS_WORKERS)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def compress_images(images: List[str]) -> List[str]:
+    """
+    Compresses all non-empty images of a request concurrently on the process
+    pool, keeping the event loop free. Results keep the input order.
+    """
+    images = [img for img in images if img and img.strip()]
+    if not images:
+        return []
+
+    loop = asyncio.get_running_loop()
+    try:
+        pool = _get_pool()
+        return list(await asyncio.gather(*(loop.run_in_executor(pool, compress_base64_image, img) for img in images)))
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM on a huge upload). Start a fresh pool next time, use threads now.
+        logger.error("[ImagePreprocess] Process pool broke, falling back to threads")
+        shutdown_pool()
+        return list(await asyncio.gather(*(asyncio.to_thread(compress_base64_image, img) for img in images)))
@@ -1,10 +1,10 @@
-import base64
 import logging
 from google import genai
 from google.genai import types
 from langchain_core.tools import StructuredTool
 
 from ..core.config import get_settings
+from .blob_store import get_blob_store
 
 logger = logging.getLogger("uvicorn.error")
 
@@ -16,6 +16,7 @@ class ImageService:
         else:
             logger.error("GOOGLE_API_KEY is missing. Image generation will fail.")
             self.client = None
+        self.blob_store = get_blob_store()
 
     def get_tool(self):
         """Returns the LangChain Tool for image generation."""
@@ -37,7 +38,7 @@ class ImageService:
 
     async def generate_image(self, prompt: str, aspect_ratio: str = "16:9") -> str:
         """
-        Generates an image and returns a Markdown string.
+        Generates an image and returns a Markdown string pointing at the image store.
         """
         if not self.client:
             return "Error: Google API Key is missing."
@@ -58,10 +59,11 @@ class ImageService:
 
             if response.generated_images:
                 image_bytes = response.generated_images[0].image.image_bytes
-                b64_string = base64.b64encode(image_bytes).decode("utf-8")
-                print("Generated Image Base64:", b64_string[:50] + "...")
+                # Store once and reference by URL instead of inlining base64 in the stream
+                blob_id = await self.blob_store.aput(image_bytes)
+                logger.info(f"[ImageService] Stored image {blob_id[:12]} ({len(image_bytes)} bytes)")
                 # Return the Markdown image
-                return f"![Generated Image](data:image/jpeg;base64,{b64_string})"
+                return f"![Generated Image]({self.blob_store.url_for(blob_id)})"
             
             return "Error: No image returned."
 
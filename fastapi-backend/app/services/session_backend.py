@@ -0,0 +1,273 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from ..core.config import Settings
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class VersionConflict(Exception):
+    """The stored session changed since the caller's cached version."""
+
+
+class SessionBackend(ABC):
+    """
+    Where session history lives behind the in-process BoundedSessionStore.
+
+    `shared` backends are the source of truth and may be written by other
+    worker processes, so the store validates its cached copy with version()
+    before using it. Non-shared backends only see what the store evicts.
+    """
+
+    shared = False
+
+    @abstractmethod
+    def read(self, session_id: str, limit: Optional[int] = None, offset: int = 0) -> Optional[List[BaseMessage]]:
+        """The window of messages ending `offset` messages before the newest, oldest first. None if unknown."""
+
+    @abstractmethod
+    def append(self, session_id: str, messages: List[BaseMessage], expected_version: Optional[int] = None) -> int:
+        """
+        Appends messages and returns the new version. Raises VersionConflict
+        if expected_version is given and the stored version differs.
+        """
+
+    @abstractmethod
+    def replace(self, session_id: str, messages: List[BaseMessage], expected_version: Optional[int] = None) -> int:
+        """Replaces the stored history and returns the new version (compare-and-swap like append)."""
+
+    @abstractmethod
+    def read_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session's rolling summary of turns older than the prompt window."""
+
+    @abstractmethod
+    def write_summary(self, session_id: str, summary: Optional[Dict[str, Any]]):
+        """Stores (or with None, clears) the rolling summary. Doesn't change the version."""
+
+    def version(self, session_id: str) -> int:
+        return 0
+
+    def evicted(self, session_id: str, messages: List[BaseMessage]):
+        """Called when the store drops a session from memory."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__}
+
+    def close(self):
+        pass
+
+
+class InMemorySessionBackend(SessionBackend):
+    """
+    Process-local sessions: the BoundedSessionStore holds the history and
+    only evicted sessions are written out, one JSON file each under
+    spill_dir, to be loaded back on their next access. Summaries of
+    resident sessions are kept here and spilled with their messages.
+    """
+
+    def __init__(self, spill_dir: Optional[str] = None, spill_ttl: float = 7 * 24 * 60 * 60):
+        self.spill_dir = spill_dir
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._prune_spill(spill_ttl)
+
+    def _spill_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha1(session_id.encode("utf-8")).hexdigest() + ".json")
+
+    def read(self, session_id: str, limit: Optional[int] = None, offset: int = 0) -> Optional[List[BaseMessage]]:
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(session_id)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                data = {"messages": data}  # Spills written before summaries existed
+            messages = messages_from_dict(data["messages"])
+            if data.get("summary"):
+                self._summaries[session_id] = data["summary"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"[SessionBackend] Spill read failed for {session_id}: {e}")
+            return None
+        try:
+            os.remove(path)  # Resident again; the spill is rewritten on the next eviction
+        except OSError:
+            pass
+        end = len(messages) - offset
+        return messages[max(0, end - limit) if limit else 0:end]
+
+    def append(self, session_id: str, messages: List[BaseMessage], expected_version: Optional[int] = None) -> int:
+        return 0  # The store's copy is the only one
+
+    def replace(self, session_id: str, messages: List[BaseMessage], expected_version: Optional[int] = None) -> int:
+        return 0
+
+    def read_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return self._summaries.get(session_id)
+
+    def write_summary(self, session_id: str, summary: Optional[Dict[str, Any]]):
+        if summary:
+            self._summaries[session_id] = summary
+        else:
+            self._summaries.pop(session_id, None)
+
+    def evicted(self, session_id: str, messages: List[BaseMessage]):
+        summary = self._summaries.pop(session_id, None)
+        if not self.spill_dir or not messages:
+            return
+        path = self._spill_path(session_id)
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"messages": messages_to_dict(messages), "summary": summary}, f)
+            os.replace(path + ".tmp", path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"[SessionBackend] Spill write failed for {session_id}: {e}")
+
+    def _prune_spill(self, spill_ttl: float):
+        cutoff = time.time() - spill_ttl
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Persistent sessions in one SQLite file (WAL mode), shared by every
+    worker process on the box. Messages are appended per session with a
+    sequence number; a per-session version counter lets each worker's
+    in-memory cache detect writes made by the others, and makes writes
+    compare-and-swap. Only the newest max_messages rows per session are kept.
+    """
+
+    shared = True
+
+    def __init__(self, db_path: str, max_messages: Optional[int] = None, busy_timeout_ms: int = 5000):
+        self.max_messages = max_messages
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, version INTEGER NOT NULL, next_seq INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, payload TEXT NOT NULL, "
+            "PRIMARY KEY (session_id, seq))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_summaries ("
+            "session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def read(self, session_id: str, limit: Optional[int] = None, offset: int = 0) -> Optional[List[BaseMessage]]:
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone() is None:
+                return None
+            rows = self._db.execute(
+                "SELECT payload FROM session_messages WHERE session_id = ? ORDER BY seq DESC LIMIT ? OFFSET ?",
+                (session_id, limit if limit else -1, offset),
+            ).fetchall()
+        return messages_from_dict([json.loads(payload) for (payload,) in reversed(rows)])
+
+    def _write(self, session_id: str, messages: List[BaseMessage], replace: bool,
+               expected_version: Optional[int]) -> int:
+        payloads = [json.dumps(d) for d in messages_to_dict(messages)]
+        with self._lock:
+            try:
+                # IMMEDIATE takes the write lock up front, so concurrent workers serialize here
+                self._db.execute("BEGIN IMMEDIATE")
+                row = self._db.execute(
+                    "SELECT version, next_seq FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                version, next_seq = row if row else (0, 0)
+                if expected_version is not None and version != expected_version:
+                    raise VersionConflict(f"{session_id}: expected v{expected_version}, stored v{version}")
+                if replace:
+                    self._db.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+                self._db.executemany(
+                    "INSERT INTO session_messages (session_id, seq, payload) VALUES (?, ?, ?)",
+                    [(session_id, next_seq + i, payload) for i, payload in enumerate(payloads)],
+                )
+                if self.max_messages:
+                    # Compact to the window; nothing older is ever read back
+                    self._db.execute(
+                        "DELETE FROM session_messages WHERE session_id = ? AND seq < ?",
+                        (session_id, next_seq + len(payloads) - self.max_messages),
+                    )
+                self._db.execute(
+                    "INSERT INTO sessions (session_id, version, next_seq, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (session_id) DO UPDATE SET version = excluded.version, "
+                    "next_seq = excluded.next_seq, updated_at = excluded.updated_at",
+                    (session_id, version + 1, next_seq + len(payloads), time.time()),
+                )
+                self._db.execute("COMMIT")
+                return version + 1
+            except (sqlite3.Error, VersionConflict):
+                self._db.execute("ROLLBACK")
+                raise
+
+    def append(self, session_id: str, messages: List[BaseMessage], expected_version: Optional[int] = None) -> int:
+        return self._write(session_id, messages, replace=False, expected_version=expected_version)
+
+    def replace(self, session_id: str, messages: List[BaseMessage], expected_version: Optional[int] = None) -> int:
+        return self._write(session_id, messages, replace=True, expected_version=expected_version)
+
+    def read_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT summary FROM session_summaries WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def write_summary(self, session_id: str, summary: Optional[Dict[str, Any]]):
+        with self._lock:
+            if summary:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO session_summaries (session_id, summary, updated_at) VALUES (?, ?, ?)",
+                    (session_id, json.dumps(summary), time.time()),
+                )
+            else:
+                self._db.execute("DELETE FROM session_summaries WHERE session_id = ?", (session_id,))
+
+    def version(self, session_id: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            messages = self._db.execute("SELECT COUNT(*) FROM session_messages").fetchone()[0]
+        return {"backend": type(self).__name__, "stored_sessions": sessions, "stored_messages": messages}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def create_session_backend(settings: Settings) -> SessionBackend:
+    if settings.SESSION_BACKEND == "sqlite":
+        return SQLiteSessionBackend(settings.SESSION_DB_PATH, max_messages=settings.SESSION_HISTORY_MESSAGES)
+    if settings.SESSION_BACKEND != "memory":
+        logger.error(f"[SessionBackend] Unknown SESSION_BACKEND '{settings.SESSION_BACKEND}', using memory")
+    return InMemorySessionBackend(settings.SESSION_SPILL_PATH)
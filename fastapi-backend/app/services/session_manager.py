@@ -1,64 +1,229 @@
-from collections import defaultdict
+import hashlib
 import threading
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
 # LangChain Imports
 from langchain_core.chat_history import InMemoryChatMessageHistory
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 
 # Local Imports
+from ..core.config import get_settings
 from ..models.chat_models import Message
+from .session_backend import create_session_backend
+from .session_store import BoundedSessionStore
+
+# Message ids inside a session: "db:<id>" for hydrated messages with a DB id,
+# "h:<hash>" for ones without, "wt:<hash>" for turns written through at the
+# end of a stream that the DB hasn't echoed back yet (provisional).
+DB_PREFIX, HASH_PREFIX, WRITE_THROUGH_PREFIX = "db:", "h:", "wt:"
+
+
+def content_hash(sender: str, texts: List[str], image_urls: List[str]) -> str:
+    digest = hashlib.sha1(sender.encode("utf-8"))
+    digest.update(" ".join(" ".join(texts).split()).encode("utf-8"))
+    for url in image_urls:
+        digest.update(hashlib.sha1(url.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+def _message_parts(msg: Message):
+    texts = [item.value for item in msg.content if item.type == 'text']
+    images = [item.value for item in msg.content if item.type in ['image', 'image_url']]
+    return texts, images
+
 
 class SessionManager:
     """
-    Manages in-memory chat sessions and handles the hydration 
-    of history from the persistent database.
+    Manages chat sessions and handles the hydration of history from the
+    persistent database. Sessions are cached in memory in front of the
+    configured SessionBackend (SESSION_BACKEND).
     """
-    
+
     def __init__(self):
-        # Thread-safe session storage
-        self.session_store = defaultdict(InMemoryChatMessageHistory)
+        settings = get_settings()
+        # Retention cap only; what reaches the prompt is chosen by token budget (ContextWindow)
+        self.max_messages = settings.SESSION_HISTORY_MESSAGES
+        # Thread-safe, memory-bounded session cache (LRU + idle TTL + byte budget)
+        self.session_store = BoundedSessionStore(
+            max_sessions=settings.SESSION_MAX_SESSIONS,
+            max_bytes=settings.SESSION_MAX_BYTES,
+            idle_ttl=settings.SESSION_IDLE_TTL_SECONDS,
+            backend=create_session_backend(settings),
+            window=self.max_messages,
+        )
         self.store_lock = threading.Lock()
+        self.counters = {"hydrate_calls": 0, "messages_received": 0, "messages_converted": 0, "turns_written": 0,
+                         "resyncs": 0}
 
     def get_session_history(self, session_id: str) -> InMemoryChatMessageHistory:
-        """Retrieves or creates a session history object."""
-        return self.session_store[session_id]
+        """Retrieves or creates a session history object (rehydrating it if it was evicted)."""
+        return self.session_store.get(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.session_store.stats(), **self.counters}
+
+    def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Rolling summary of the turns older than the prompt window: {"text", "covered_id"}."""
+        return self.session_store.backend.read_summary(session_id)
+
+    def set_summary(self, session_id: str, summary: Optional[Dict[str, Any]]):
+        self.session_store.backend.write_summary(session_id, summary)
+
+    # --- Conversion ---
+
+    @staticmethod
+    def _to_langchain(msg: Message, message_id: str) -> Optional[BaseMessage]:
+        content_blocks = []
+
+        # Parse content blocks (Text vs Image)
+        for item in msg.content:
+            if item.type == 'text':
+                content_blocks.append({"type": "text", "text": item.value})
+            elif item.type in ['image', 'image_url']:
+                content_blocks.append({"type": "image_url", "image_url": {"url": item.value}})
+
+        if not content_blocks:
+            return None
+
+        # Add to history based on sender
+        if msg.sender == 'user':
+            return HumanMessage(content=content_blocks, id=message_id)
+        if msg.sender == 'ai':
+            # Simplified text reconstruction for history to save context window tokens
+            text_only = " ".join([b['text'] for b in content_blocks if b.get('type') == 'text'])
+            return AIMessage(content=text_only, id=message_id)
+        return None
+
+    # --- Hydration ---
 
-    def hydrate_history(self, session_id: str, messages: List[Message]):
+    def hydrate_history(self, session_id: str, messages: List[Message], replace: bool = False,
+                        after_id: Optional[str] = None) -> Dict[str, Any]:
         """
-        Restores chat history from the DB format (Pydantic models) 
+        Restores chat history from the DB format (Pydantic models)
         into LangChain format (HumanMessage/AIMessage).
-        
-        IMPLEMENTS SHORT-TERM MEMORY: Only loads the last N messages.
+
+        Incremental: messages the session already holds (matched by DB id,
+        or by content for messages without one) are skipped, so the caller
+        can send just the messages after the returned lastMessageId.
+        Provisional write-through turns are confirmed by their DB copies,
+        or dropped in favour of them. Falls back to a full rebuild when
+        replace=True or the incoming order conflicts with the session.
+        A delta (after_id set) whose anchor the session no longer holds is
+        not applied; the result asks the caller to resync with the full history.
+
+        IMPLEMENTS SHORT-TERM MEMORY: Only keeps the last SESSION_HISTORY_MESSAGES messages.
+        """
+        with self.store_lock:
+            self.counters["hydrate_calls"] += 1
+            self.counters["messages_received"] += len(messages)
+            if after_id and not replace:
+                history = self.get_session_history(session_id)
+                if not any(m.id == f"{DB_PREFIX}{after_id}" for m in history.messages):
+                    self.counters["resyncs"] += 1
+                    return {"added": 0, "messageCount": len(history.messages), "lastMessageId": None, "resync": True}
+            for _ in range(2):
+                result, persisted = self._hydrate_locked(session_id, messages, replace)
+                if persisted:
+                    break
+                # Another worker rewrote the session first; redo the merge on its version
+            return result
+
+    def _hydrate_locked(self, session_id: str, messages: List[Message], replace: bool) -> Tuple[Dict[str, Any], bool]:
+        history = self.get_session_history(session_id)
+        existing = list(history.messages)
+        index_by_id = {m.id: i for i, m in enumerate(existing) if m.id}
+        provisional = {m.id[len(WRITE_THROUGH_PREFIX):]: i for i, m in enumerate(existing)
+                       if m.id and m.id.startswith(WRITE_THROUGH_PREFIX)}
+
+        keyed = []
+        matched = set()
+        rewritten = False  # Anything other than a pure append must replace the stored history
+        renamed = {}
+        anchor_pos = -1  # Last incoming message the session already has
+        for pos, msg in enumerate(messages):
+            texts, images = _message_parts(msg)
+            digest = content_hash(msg.sender, texts, images)
+            message_id = f"{DB_PREFIX}{msg.id}" if msg.id else f"{HASH_PREFIX}{digest}"
+            keyed.append((msg, message_id))
+
+            if message_id in index_by_id:
+                matched.add(index_by_id[message_id])
+                anchor_pos = pos
+            elif digest in provisional:
+                # DB echo of a written-through turn: just adopt its id
+                index = provisional.pop(digest)
+                renamed[existing[index].id] = message_id
+                existing[index].id = message_id
+                matched.add(index)
+                rewritten = True
+                anchor_pos = pos
+
+        # Messages before the anchor are older history we already trimmed;
+        # messages after it are the delta.
+        new_messages = [(msg, mid) for pos, (msg, mid) in enumerate(keyed)
+                        if pos > anchor_pos and mid not in index_by_id]
+
+        # The session has confirmed messages the caller doesn't (e.g. another branch): rebuild
+        anchor_index = max(matched) if matched else -1
+        diverged = any(
+            i > anchor_index and i not in matched and not (m.id or "").startswith(WRITE_THROUGH_PREFIX)
+            for i, m in enumerate(existing)
+        ) if anchor_pos >= 0 else False
+
+        summary = self.get_summary(session_id)
+        if replace or diverged:
+            existing, new_messages = [], keyed
+            rewritten = True
+            if summary:
+                self.set_summary(session_id, None)  # Summarized a history we just threw away
+                summary = None
+        elif new_messages and provisional:
+            # The DB has the real versions of these turns; drop our provisional copies
+            drop = set(provisional.values())
+            existing = [m for i, m in enumerate(existing) if i not in drop]
+            rewritten = True
+        if summary and summary.get("covered_id") in renamed:
+            self.set_summary(session_id, {**summary, "covered_id": renamed[summary["covered_id"]]})
+
+        # --- HYBRID MEMORY STEP 1: SLIDING WINDOW ---
+        # Only the most recent messages are kept; the prompt takes the newest
+        # that fit its token budget plus a rolling summary of the rest.
+        # Older messages are retrieved via RAG (Vector Store) instead.
+        new_messages = new_messages[-self.max_messages:]
+        converted = [m for m in (self._to_langchain(msg, mid) for msg, mid in new_messages) if m is not None]
+        self.counters["messages_converted"] += len(converted)
+
+        history.messages = (existing + converted)[-self.max_messages:]
+        persisted = True
+        if rewritten or converted:
+            persisted = self.session_store.update(session_id, appended=None if rewritten else converted)
+
+        last_id = next((m.id[len(DB_PREFIX):] for m in reversed(history.messages)
+                        if m.id and m.id.startswith(DB_PREFIX)), None)
+        return {"added": len(converted), "messageCount": len(history.messages), "lastMessageId": last_id}, persisted
+
+    # --- Write-through ---
+
+    def append_turn(self, session_id: str, user_text: str, images: List[str], ai_text: str,
+                    stored_images: Optional[List[str]] = None):
+        """
+        Writes a completed turn into the session right away, so the next
+        request sees it without the Node server re-sending history. Both
+        messages are provisional until the DB copy is hydrated.
+        stored_images: short image-store URLs for `images`, kept instead of the data URIs.
         """
-        WINDOW_SIZE = 20  # Keep last 20 messages (approx 10 exchanges)
+        user_blocks = [{"type": "text", "text": user_text}] if user_text else []
+        user_blocks += [{"type": "image_url", "image_url": {"url": img}} for img in (stored_images or images)]
+        user_id = WRITE_THROUGH_PREFIX + content_hash("user", [user_text] if user_text else [], images)
+        ai_id = WRITE_THROUGH_PREFIX + content_hash("ai", [ai_text], [])
 
         with self.store_lock:
             history = self.get_session_history(session_id)
-            history.clear()
-
-            # --- HYBRID MEMORY STEP 1: SLIDING WINDOW ---
-            # Slice to get only the most recent messages. 
-            # Older messages are retrieved via RAG (Vector Store) instead.
-            recent_messages = messages[-WINDOW_SIZE:] if len(messages) > WINDOW_SIZE else messages
-
-            for msg in recent_messages:
-                content_blocks = []
-                
-                # Parse content blocks (Text vs Image)
-                for item in msg.content:
-                    if item.type == 'text':
-                        content_blocks.append({"type": "text", "text": item.value})
-                    elif item.type in ['image', 'image_url']:
-                        content_blocks.append({"type": "image_url", "image_url": {"url": item.value}})
-                
-                if not content_blocks: 
-                    continue
-
-                # Add to history based on sender
-                if msg.sender == 'user':
-                    history.add_message(HumanMessage(content=content_blocks))
-                elif msg.sender == 'ai':
-                    # Simplified text reconstruction for history to save context window tokens
-                    text_only = " ".join([b['text'] for b in content_blocks if b.get('type') == 'text'])
-                    history.add_message(AIMessage(content=text_only))
\ No newline at end of file
+            turn = []
+            if user_blocks:
+                turn.append(HumanMessage(content=user_blocks, id=user_id))
+            if ai_text.strip():
+                turn.append(AIMessage(content=ai_text, id=ai_id))
+            history.messages = (list(history.messages) + turn)[-self.max_messages:]
+            self.counters["turns_written"] += 1
+            self.session_store.update(session_id, appended=turn)
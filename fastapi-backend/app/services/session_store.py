@@ -0,0 +1,190 @@
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import BaseMessage
+
+from .session_backend import InMemorySessionBackend, SessionBackend, VersionConflict
+
+logger = logging.getLogger("uvicorn.error")
+
+MESSAGE_OVERHEAD_BYTES = 200  # Python object + LangChain message bookkeeping, roughly
+
+
+def message_bytes(message: BaseMessage) -> int:
+    """Approximate resident size of a message, dominated by base64 image payloads."""
+    content = message.content
+    if isinstance(content, str):
+        return MESSAGE_OVERHEAD_BYTES + len(content)
+    size = MESSAGE_OVERHEAD_BYTES
+    for block in content:
+        if isinstance(block, str):
+            size += len(block)
+        elif block.get("type") == "image_url":
+            image_url = block.get("image_url")
+            size += len(image_url.get("url", "") if isinstance(image_url, dict) else image_url or "")
+        else:
+            size += len(block.get("text", ""))
+    return size
+
+
+class _Entry:
+    __slots__ = ("history", "size", "last_access", "version")
+
+    def __init__(self, history: InMemoryChatMessageHistory, version: int = 0):
+        self.history = history
+        self.size = sum(message_bytes(m) for m in history.messages)
+        self.last_access = time.monotonic()
+        self.version = version
+
+
+class BoundedSessionStore:
+    """
+    LRU session store with an idle TTL and a byte budget, reading through
+    to a SessionBackend.
+
+    Sessions missing from memory are loaded from the backend (the newest
+    `window` messages). Changes are written to the backend by update().
+    With a shared backend every hit is validated against the backend's
+    version, so writes from other workers are picked up on the next access,
+    and every write is conditional on the version the cache holds.
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_bytes: int = 256 * 1024 * 1024,
+                 idle_ttl: float = 60 * 60, backend: Optional[SessionBackend] = None, window: Optional[int] = None):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.backend = backend or InMemorySessionBackend()
+        self.window = window
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.total_bytes = 0
+        self.counters = {"hits": 0, "stale": 0, "rehydrated": 0, "created": 0, "write_conflicts": 0,
+                         "evicted_lru": 0, "evicted_bytes": 0, "evicted_idle": 0, "bytes_evicted": 0}
+
+    # --- Access ---
+
+    def get(self, session_id: str) -> InMemoryChatMessageHistory:
+        """Returns the session's history, loading it from the backend or creating it."""
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.get(session_id)
+            version = self.backend.version(session_id) if self.backend.shared else 0
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+                entry.last_access = time.monotonic()
+                if entry.version == version:
+                    self.counters["hits"] += 1
+                    return entry.history
+                # Another worker wrote this session since we cached it
+                self.counters["stale"] += 1
+                self._entries.pop(session_id)
+                self.total_bytes -= entry.size
+
+            history = InMemoryChatMessageHistory()
+            stored = self.backend.read(session_id, limit=self.window)
+            if stored is not None:
+                history.add_messages(stored)
+                self.counters["rehydrated"] += 1
+            else:
+                self.counters["created"] += 1
+
+            entry = _Entry(history, version)
+            self._entries[session_id] = entry
+            self.total_bytes += entry.size
+            self._evict_over_budget(keep=session_id)
+            return history
+
+    def update(self, session_id: str, appended: Optional[List[BaseMessage]] = None) -> bool:
+        """
+        Persists and re-measures a session after its history was changed in
+        place: `appended` messages are appended to the backend, otherwise
+        the whole (windowed) history replaces the stored one.
+
+        Writes are conditional on the cached version. If another worker got
+        there first, an append is re-applied on top of the reloaded history;
+        a replace is abandoned and the cache reloaded. Returns False then,
+        so the caller can redo its change against the fresh history.
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return True
+            ok = True
+            try:
+                if appended is not None:
+                    entry.version = self._append(session_id, entry, appended)
+                else:
+                    entry.version = self.backend.replace(
+                        session_id, entry.history.messages, expected_version=entry.version
+                    )
+            except VersionConflict as e:
+                logger.warning(f"[SessionStore] Write conflict, reloading: {e}")
+                self.counters["write_conflicts"] += 1
+                self._reload(session_id, entry)
+                ok = False
+            new_size = sum(message_bytes(m) for m in entry.history.messages)
+            self.total_bytes += new_size - entry.size
+            entry.size = new_size
+            entry.last_access = time.monotonic()
+            self._evict_over_budget(keep=session_id)
+            return ok
+
+    def _append(self, session_id: str, entry: _Entry, appended: List[BaseMessage], attempts: int = 3) -> int:
+        for _ in range(attempts - 1):
+            try:
+                return self.backend.append(session_id, appended, expected_version=entry.version)
+            except VersionConflict:
+                self.counters["write_conflicts"] += 1
+                self._reload(session_id, entry)
+                entry.history.messages = (list(entry.history.messages) + appended)[-(self.window or 0):]
+        return self.backend.append(session_id, appended, expected_version=entry.version)
+
+    def _reload(self, session_id: str, entry: _Entry):
+        """Replaces the cached history (in place, callers may hold it) with the stored one."""
+        entry.version = self.backend.version(session_id)  # Before the read: a later write shows up as a conflict
+        entry.history.messages = self.backend.read(session_id, limit=self.window) or []
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    # --- Eviction ---
+
+    def _evict(self, session_id: str, reason: str):
+        entry = self._entries.pop(session_id)
+        self.total_bytes -= entry.size
+        self.counters[f"evicted_{reason}"] += 1
+        self.counters["bytes_evicted"] += entry.size
+        self.backend.evicted(session_id, entry.history.messages)
+
+    def _evict_idle(self):
+        if not self.idle_ttl:
+            return
+        cutoff = time.monotonic() - self.idle_ttl
+        # Oldest first; stop at the first session that is still fresh
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if entry.last_access > cutoff:
+                break
+            self._evict(session_id, "idle")
+
+    def _evict_over_budget(self, keep: str):
+        """Evicts least-recently-used sessions (never `keep`) until both limits hold."""
+        while len(self._entries) > self.max_sessions or self.total_bytes > self.max_bytes:
+            victim = next((sid for sid in self._entries if sid != keep), None)
+            if victim is None:
+                break
+            self._evict(victim, "lru" if len(self._entries) > self.max_sessions else "bytes")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["sessions"] = len(self._entries)
+            stats["resident_bytes"] = self.total_bytes
+            stats["max_bytes"] = self.max_bytes
+            stats.update(self.backend.stats())
+            return stats
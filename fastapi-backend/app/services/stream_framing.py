@@ -0,0 +1,168 @@
+import asyncio
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+# --- Negotiated formats ---
+FORMAT_TEXT = "text"      # Legacy text/plain with __MARKER__: prefixes
+FORMAT_SSE = "sse"
+FORMAT_NDJSON = "ndjson"
+
+MEDIA_TYPES = {
+    FORMAT_TEXT: "text/plain",
+    FORMAT_SSE: "text/event-stream",
+    FORMAT_NDJSON: "application/x-ndjson",
+}
+
+_IMAGE_MARKDOWN_RE = re.compile(r"^\s*!\[[^\]]*\]\([^)]+\)\s*$", re.DOTALL)
+_ERROR_PREFIXES = ("[Error]", "\n[System Error]")
+
+
+def negotiate_format(accept: Optional[str], requested: Optional[str] = None) -> str:
+    """Picks the framing from an explicit ?format= value, else from the Accept header."""
+    if requested:
+        requested = requested.lower()
+        if requested in (FORMAT_SSE, FORMAT_NDJSON, FORMAT_TEXT):
+            return requested
+    accept = (accept or "").lower()
+    if "text/event-stream" in accept:
+        return FORMAT_SSE
+    if "application/x-ndjson" in accept or "application/ndjson" in accept:
+        return FORMAT_NDJSON
+    return FORMAT_TEXT
+
+
+def classify_chunk(chunk: str) -> Tuple[Optional[str], Dict[str, Any]]:
+    """
+    Maps one legacy chunk from ChatService.stream_groq_message to a typed event.
+    Returns (None, {}) for chunks that carry no information on their own.
+    """
+    if chunk.startswith("__STATUS__:"):
+        return "status", {"text": chunk[len("__STATUS__:"):]}
+    if chunk.startswith("__ICON__:"):
+        return "status", {"icon": chunk[len("__ICON__:"):]}
+    if chunk.startswith("__AGENT__:"):
+        return "agent", {"name": chunk[len("__AGENT__:"):]}
+    if chunk.startswith("__THOUGHT__:"):
+        return "thought", {"text": chunk[len("__THOUGHT__:"):].strip()}
+    if chunk.startswith("__SOURCES__:"):
+        try:
+            return "sources", {"sources": json.loads(chunk[len("__SOURCES__:"):])}
+        except ValueError:
+            return None, {}
+    if chunk.startswith("__SKELETON_START__:"):
+        return "image", {"state": "pending"}
+    if chunk.startswith("__SKELETON_END__:"):
+        return "image", {"state": "done"}
+    if chunk.startswith("__ANSWER__:"):
+        return None, {}
+    if chunk.startswith(_ERROR_PREFIXES):
+        return "error", {"message": chunk.strip()}
+    if _IMAGE_MARKDOWN_RE.match(chunk):
+        return "image", {"markdown": chunk.strip()}
+    return "answer_delta", {"text": chunk}
+
+
+class StreamFramer:
+    """
+    Re-frames the legacy chat stream as typed SSE or NDJSON events with IDs,
+    heartbeats, and answer deltas coalesced over a short flush interval.
+    """
+
+    def __init__(self, fmt: str, flush_interval: float = 0.05, heartbeat_interval: float = 15.0,
+                 max_delta_chars: int = 4096):
+        self.fmt = fmt
+        self.flush_interval = flush_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.max_delta_chars = max_delta_chars
+        self._next_id = 0
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES[self.fmt]
+
+    def encode(self, event_type: str, data: Dict[str, Any]) -> str:
+        self._next_id += 1
+        payload = json.dumps(data, ensure_ascii=False)
+        if self.fmt == FORMAT_SSE:
+            return f"id: {self._next_id}\nevent: {event_type}\ndata: {payload}\n\n"
+        return json.dumps({"id": self._next_id, "type": event_type, "data": data}, ensure_ascii=False) + "\n"
+
+    def heartbeat(self) -> str:
+        if self.fmt == FORMAT_SSE:
+            return ": heartbeat\n\n"
+        return json.dumps({"type": "heartbeat"}) + "\n"
+
+    async def frame(self, source: AsyncIterator[str]) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue()
+        end = object()
+
+        async def pump():
+            try:
+                async for chunk in source:
+                    await queue.put(chunk)
+            except Exception as e:
+                await queue.put(e)
+            finally:
+                await queue.put(end)
+
+        pump_task = asyncio.create_task(pump())
+        pending_text = []
+        pending_size = 0
+        flush_deadline = None
+        last_write = time.monotonic()
+
+        def flush():
+            nonlocal pending_text, pending_size, flush_deadline
+            frame = self.encode("answer_delta", {"text": "".join(pending_text)})
+            pending_text, pending_size, flush_deadline = [], 0, None
+            return frame
+
+        try:
+            while True:
+                now = time.monotonic()
+                deadline = flush_deadline if flush_deadline is not None else last_write + self.heartbeat_interval
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=max(0.0, deadline - now))
+                except asyncio.TimeoutError:
+                    if pending_text:
+                        yield flush()
+                    else:
+                        yield self.heartbeat()
+                    last_write = time.monotonic()
+                    continue
+
+                if item is end:
+                    break
+                if isinstance(item, Exception):
+                    if pending_text:
+                        yield flush()
+                    yield self.encode("error", {"message": str(item)})
+                    break
+
+                event_type, data = classify_chunk(item)
+                if event_type is None:
+                    continue
+                if event_type == "answer_delta":
+                    pending_text.append(data["text"])
+                    pending_size += len(data["text"])
+                    if flush_deadline is None:
+                        flush_deadline = time.monotonic() + self.flush_interval
+                    if pending_size >= self.max_delta_chars:
+                        yield flush()
+                        last_write = time.monotonic()
+                    continue
+
+                # Keep ordering: pending answer text goes out before any other event
+                if pending_text:
+                    yield flush()
+                yield self.encode(event_type, data)
+                last_write = time.monotonic()
+
+            if pending_text:
+                yield flush()
+            yield self.encode("done", {})
+        finally:
+            if not pump_task.done():
+                pump_task.cancel()
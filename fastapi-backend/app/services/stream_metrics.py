@@ -0,0 +1,54 @@
+import threading
+from functools import lru_cache
+from typing import Any, Dict
+
+
+class CancellationMetrics:
+    """
+    Tracks chat turns that finished vs. were cut short by a client disconnect.
+
+    Savings are estimates: a cancelled turn is assumed to have had the
+    average length (tokens and seconds) of recently completed turns, so
+    what it didn't produce is counted as saved.
+    """
+
+    def __init__(self, smoothing: float = 0.1):
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self.completed_turns = 0
+        self.cancelled_turns = 0
+        self.avg_tokens = 0.0
+        self.avg_seconds = 0.0
+        self.tokens_saved = 0.0
+        self.seconds_saved = 0.0
+
+    def record_completed(self, tokens: int, seconds: float):
+        with self._lock:
+            if self.completed_turns == 0:
+                self.avg_tokens, self.avg_seconds = float(tokens), seconds
+            else:
+                a = self.smoothing
+                self.avg_tokens = (1 - a) * self.avg_tokens + a * tokens
+                self.avg_seconds = (1 - a) * self.avg_seconds + a * seconds
+            self.completed_turns += 1
+
+    def record_cancelled(self, tokens: int, seconds: float):
+        with self._lock:
+            self.cancelled_turns += 1
+            self.tokens_saved += max(0.0, self.avg_tokens - tokens)
+            self.seconds_saved += max(0.0, self.avg_seconds - seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "completed_turns": self.completed_turns,
+            "cancelled_turns": self.cancelled_turns,
+            "avg_turn_tokens": round(self.avg_tokens, 1),
+            "avg_turn_seconds": round(self.avg_seconds, 3),
+            "tokens_saved_estimate": round(self.tokens_saved),
+            "seconds_saved_estimate": round(self.seconds_saved, 3),
+        }
+
+
+@lru_cache()
+def get_cancellation_metrics() -> CancellationMetrics:
+    return CancellationMetrics()
@@ -0,0 +1,170 @@
+from dataclasses import dataclass
+from typing import List
+
+# --- Event kinds ---
+THOUGHT = "thought"            # value: the reasoning line (without "THOUGHT:")
+ANSWER_START = "answer_start"  # value: ""
+TEXT = "text"                  # value: answer text to stream as-is
+IMAGE = "image"                # value: prompt from [[GENERATE_IMAGE: ...]]
+
+THOUGHT_TAG = "THOUGHT:"
+TAG_OPEN = "[["
+TAG_CLOSE = "]]"
+IMAGE_TAG = "GENERATE_IMAGE:"
+YOUTUBE_TAG = "YOUTUBE:"
+KNOWN_TAGS = (IMAGE_TAG, YOUTUBE_TAG)
+
+# Bounded lookahead: anything longer is not one of our tags
+MAX_TAG_CHARS = 600
+MAX_THOUGHT_CHARS = 2000
+
+
+@dataclass
+class StreamEvent:
+    kind: str
+    value: str = ""
+
+
+class AnswerStreamParser:
+    """
+    Incremental tokenizer for the agent output protocol:
+
+        THOUGHT: <one line of reasoning>
+        <answer text, possibly containing [[GENERATE_IMAGE: ...]] / [[YOUTUBE: ...]]>
+
+    feed() does O(1) amortized work per character: text is only held back
+    while it could still be the start of THOUGHT: or of a [[...]] tag, and
+    that held tail is capped at MAX_TAG_CHARS.
+    """
+
+    _PRELUDE, _THOUGHT, _ANSWER = range(3)
+
+    def __init__(self):
+        self._state = self._PRELUDE
+        self._held = ""              # Undecided tail (prelude, thought line or partial tag)
+        self._scan_from = 0          # Where to resume looking for "]]" in a held tag
+
+    @property
+    def answering(self) -> bool:
+        return self._state == self._ANSWER
+
+    def force_answer(self) -> List[StreamEvent]:
+        """Skips thought detection (e.g. another node already started the answer)."""
+        if self._state == self._ANSWER:
+            return []
+        held, self._held = self._held, ""
+        self._state = self._ANSWER
+        return self._feed_answer(held)
+
+    def feed(self, chunk: str) -> List[StreamEvent]:
+        if not chunk:
+            return []
+        if self._state == self._ANSWER:
+            return self._feed_answer(chunk)
+
+        self._held += chunk
+        if self._state == self._PRELUDE:
+            return self._feed_prelude()
+        return self._feed_thought(len(self._held) - len(chunk))
+
+    def finish(self) -> List[StreamEvent]:
+        """Flushes whatever is still held back at the end of the stream."""
+        events: List[StreamEvent] = []
+        held, self._held = self._held, ""
+        self._scan_from = 0
+        if self._state != self._ANSWER:
+            self._state = self._ANSWER
+            if held:
+                events.append(StreamEvent(ANSWER_START))
+        if held:
+            events.append(StreamEvent(TEXT, held))
+        return events
+
+    # --- States ---
+
+    def _feed_prelude(self) -> List[StreamEvent]:
+        clean = self._held.lstrip()
+        if not clean:
+            return []
+        if clean.startswith(THOUGHT_TAG):
+            self._state = self._THOUGHT
+            return self._feed_thought(0)
+        if THOUGHT_TAG.startswith(clean):
+            return []  # Could still become "THOUGHT:", wait for more
+
+        # Not a thought. Answer immediately.
+        held, self._held = self._held, ""
+        self._state = self._ANSWER
+        return [StreamEvent(ANSWER_START)] + self._feed_answer(held)
+
+    def _feed_thought(self, new_from: int) -> List[StreamEvent]:
+        newline = self._held.find("\n", new_from)
+        if newline == -1:
+            if len(self._held) < MAX_THOUGHT_CHARS:
+                return []
+            newline = len(self._held)
+
+        thought_line, remaining = self._held[:newline], self._held[newline + 1:]
+        self._held = ""
+        self._state = self._ANSWER
+        thought = thought_line.strip()[len(THOUGHT_TAG):].strip()
+
+        events = [StreamEvent(THOUGHT, thought), StreamEvent(ANSWER_START)]
+        if remaining:
+            events.extend(self._feed_answer(remaining))
+        return events
+
+    def _feed_answer(self, chunk: str) -> List[StreamEvent]:
+        events: List[StreamEvent] = []
+        if self._held:
+            text, scan_from = self._held + chunk, self._scan_from
+            self._held = ""
+        else:
+            text, scan_from = chunk, 0
+        pos = 0
+
+        while pos < len(text):
+            if scan_from == 0:
+                start = text.find(TAG_OPEN, pos)
+                if start == -1:
+                    # A trailing "[" might be the first half of "[["
+                    end = len(text) - 1 if text.endswith("[") else len(text)
+                    if end > pos:
+                        events.append(StreamEvent(TEXT, text[pos:end]))
+                    self._held = text[end:]
+                    self._scan_from = 0
+                    return events
+                if start > pos:
+                    events.append(StreamEvent(TEXT, text[pos:start]))
+                pos = start
+                scan_from = start + len(TAG_OPEN)
+
+            # Inside a possible tag starting at pos
+            body_start = pos + len(TAG_OPEN)
+            head = text[body_start:body_start + 20].lstrip()
+            if head and not any(t.startswith(head[:len(t)]) for t in KNOWN_TAGS):
+                # Not one of ours: release one "[" as text and keep scanning
+                events.append(StreamEvent(TEXT, "["))
+                pos, scan_from = pos + 1, 0
+                continue
+
+            close = text.find(TAG_CLOSE, max(scan_from - 1, body_start), pos + MAX_TAG_CHARS)
+            if close == -1:
+                if len(text) - pos >= MAX_TAG_CHARS:
+                    events.append(StreamEvent(TEXT, "["))
+                    pos, scan_from = pos + 1, 0
+                    continue
+                self._held = text[pos:]
+                self._scan_from = len(self._held)
+                return events
+
+            tag = text[pos:close + len(TAG_CLOSE)]
+            body = text[body_start:close].strip()
+            if body.startswith(IMAGE_TAG):
+                events.append(StreamEvent(IMAGE, body[len(IMAGE_TAG):].strip()))
+            else:
+                events.append(StreamEvent(TEXT, tag))  # e.g. YouTube embeds, emitted whole
+            pos, scan_from = close + len(TAG_CLOSE), 0
+
+        self._scan_from = 0
+        return events
@@ -1,46 +1,299 @@
-import io
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import wave
 from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+import numpy as np
 from fastapi import UploadFile
-from groq import Groq  # Using Groq client directly
+from groq import AsyncGroq, DefaultAsyncHttpxClient  # Using Groq client directly
 
 from ..core.config import Settings, get_settings
+from .audio_segmenter import SAMPLE_RATE, drop_overlap, encode_wav, plan_segments, trim_silence
+from .cache_service import _MISSING, get_tool_cache
+
+logger = logging.getLogger("uvicorn.error")
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+CACHE_TOOL = "transcribe_audio"
+
+
+class STTMetrics:
+    """Upload bytes saved by normalization and transcript cache hit rate."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.cache_hits = 0
+        self.silent_clips = 0
+        self.original_bytes = 0
+        self.uploaded_bytes = 0
+        self.trimmed_seconds = 0.0
+
+    def record(self, original: int, uploaded: int, cache_hit: bool = False, silent: bool = False,
+               trimmed_seconds: float = 0.0):
+        with self._lock:
+            self.requests += 1
+            self.cache_hits += cache_hit
+            self.silent_clips += silent
+            self.original_bytes += original
+            self.uploaded_bytes += uploaded
+            self.trimmed_seconds += trimmed_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "cache_hit_rate": round(self.cache_hits / self.requests, 3) if self.requests else 0.0,
+            "silent_clips": self.silent_clips,
+            "original_bytes": self.original_bytes,
+            "uploaded_bytes": self.uploaded_bytes,
+            "bytes_saved": self.original_bytes - self.uploaded_bytes,
+            "trimmed_seconds": round(self.trimmed_seconds, 1),
+        }
+
 
 class STTService:
     """
     Speech-to-text using Groq's Whisper (Distil-Whisper).
+
+    Uploads are spooled to disk, decoded to 16 kHz mono PCM (memory-mapped),
+    trimmed of leading/trailing silence, split at quiet points into
+    overlapping segments and transcribed concurrently. Segment texts are
+    stitched back in order. Transcripts are cached by content hash.
     """
 
     def __init__(self, settings: Settings):
         if not settings.GROQ_API_KEY:
             raise ValueError("GROQ_API_KEY is required for STT.")
-        
-        # Initialize Groq Client
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
+
+        # Initialize Groq Client (async, shared keep-alive pool)
+        self.client = AsyncGroq(
+            api_key=settings.GROQ_API_KEY,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings.STT_CONCURRENCY * 2,
+                    max_keepalive_connections=settings.STT_CONCURRENCY,
+                ),
+            ),
+        )
+        self.model_name = "distil-whisper-large-v3-en"  # Groq's fast whisper model
+        self.segment_seconds = settings.STT_SEGMENT_SECONDS
+        self.overlap_seconds = settings.STT_SEGMENT_OVERLAP_SECONDS
+        self.search_seconds = settings.STT_SILENCE_SEARCH_SECONDS
+        self.concurrency = settings.STT_CONCURRENCY
+        self.silence_floor = settings.STT_SILENCE_FLOOR
+        self.silence_relative = settings.STT_SILENCE_RELATIVE
+        self.trim_padding = settings.STT_TRIM_PADDING_SECONDS
+        self.ffmpeg = shutil.which("ffmpeg")
+        self.cache = get_tool_cache()
+        self.metrics = STTMetrics()
+
+    # --- Upload / Decode ---
+
+    async def _spool(self, file: UploadFile, directory: str) -> Tuple[str, str, int]:
+        """
+        Copies the upload to disk chunk by chunk instead of reading it whole.
+        Returns (path, sha256 of the content, size).
+        """
+        path = os.path.join(directory, "upload-" + os.path.basename(file.filename or "audio.wav"))
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                digest.update(chunk)
+                size += len(chunk)
+                await asyncio.to_thread(out.write, chunk)
+        return path, digest.hexdigest(), size
+
+    async def _decode(self, path: str, directory: str) -> Optional[np.ndarray]:
+        """
+        Decodes to raw 16 kHz mono int16 on disk and memory-maps it.
+        Uses ffmpeg when installed; otherwise only WAV input can be decoded.
+        Returns None when the audio can't be decoded (it's then sent as-is).
+        """
+        raw_path = os.path.join(directory, "audio.pcm")
+        if self.ffmpeg:
+            process = await asyncio.create_subprocess_exec(
+                self.ffmpeg, "-nostdin", "-loglevel", "error", "-y", "-i", path,
+                "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-acodec", "pcm_s16le", raw_path,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+            )
+            _, stderr = await process.communicate()
+            if process.returncode != 0:
+                logger.error(f"[STT] ffmpeg decode failed: {stderr.decode(errors='ignore')[:200]}")
+                return None
+        else:
+            try:
+                await asyncio.to_thread(_wav_to_pcm, path, raw_path)
+            except (wave.Error, EOFError, ValueError):
+                return None
+
+        if os.path.getsize(raw_path) < 2:
+            return None
+        return np.memmap(raw_path, dtype="<i2", mode="r")
+
+    async def _encode(self, samples: np.ndarray) -> Tuple[str, bytes]:
+        """Normalized 16 kHz mono audio as FLAC (lossless, about half of WAV), or WAV without ffmpeg."""
+        wav = await asyncio.to_thread(encode_wav, samples)
+        if not self.ffmpeg:
+            return "wav", wav
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg, "-nostdin", "-loglevel", "error", "-f", "wav", "-i", "pipe:0", "-f", "flac", "pipe:1",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        )
+        flac, _ = await process.communicate(wav)
+        if process.returncode != 0 or not flac:
+            return "wav", wav
+        return "flac", flac
+
+    # --- Cache ---
+
+    def _cache_args(self, kind: str, digest: str) -> Dict[str, str]:
+        return {"model": self.model_name, kind: digest}
+
+    async def _cached(self, kind: str, digest: str) -> Optional[str]:
+        value = await self.cache.aget(CACHE_TOOL, self._cache_args(kind, digest))
+        return None if value is _MISSING else value
+
+    # --- Transcription ---
+
+    async def _transcribe_bytes(self, filename: str, content: bytes) -> str:
+        transcription = await self.client.audio.transcriptions.create(
+            file=(filename, content),
+            model=self.model_name,
+            response_format="json",
+            language="en",
+            temperature=0.0
+        )
+        return transcription.text
+
+    async def transcribe_stream(self, file: UploadFile) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Yields (segment_index, text) in order as soon as each segment (and all
+        before it) is transcribed. Overlap with the previous segment is removed.
+        """
+        with tempfile.TemporaryDirectory(prefix="stt-") as directory:
+            path, upload_digest, original_size = await self._spool(file, directory)
+
+            # Exact same upload (e.g. a retry): no decoding, no Whisper call
+            cached = await self._cached("upload_sha256", upload_digest)
+            if cached is not None:
+                self.metrics.record(original_size, 0, cache_hit=True)
+                yield 0, cached
+                return
+
+            samples = await self._decode(path, directory)
+            pcm_digest = None
+            trimmed_seconds = 0.0
+            silent = False
+            if samples is not None:
+                start, end = await asyncio.to_thread(
+                    trim_silence, samples, SAMPLE_RATE, self.silence_floor, self.silence_relative, self.trim_padding
+                )
+                if end > start:
+                    trimmed_seconds = (len(samples) - (end - start)) / SAMPLE_RATE
+                    samples = samples[start:end]
+                else:
+                    # Nothing above the floor: don't guess, let Whisper hear the whole clip
+                    silent = True
+
+                # Same audio in a different container / sample rate
+                pcm_digest = await asyncio.to_thread(lambda: hashlib.sha256(memoryview(samples)).hexdigest())
+                cached = await self._cached("pcm_sha256", pcm_digest)
+                if cached is not None:
+                    await self.cache.aset(CACHE_TOOL, self._cache_args("upload_sha256", upload_digest), cached)
+                    self.metrics.record(original_size, 0, cache_hit=True, trimmed_seconds=trimmed_seconds)
+                    yield 0, cached
+                    return
+
+            segments = plan_segments(samples, SAMPLE_RATE, self.segment_seconds, self.overlap_seconds,
+                                     self.search_seconds) if samples is not None else []
+            uploaded = 0
+            parts = []
+
+            try:
+                if len(segments) <= 1:
+                    # Short (or undecodable) clip: one request, with whichever payload is smaller
+                    filename, content = file.filename or "audio.wav", await asyncio.to_thread(_read_file, path)
+                    if samples is not None:
+                        ext, normalized = await self._encode(samples)
+                        if len(normalized) < len(content):
+                            filename, content = f"audio.{ext}", normalized
+                    uploaded = len(content)
+                    text = (await self._transcribe_bytes(filename, content)).strip()
+                    parts.append(text)
+                    yield 0, text
+                else:
+                    semaphore = asyncio.Semaphore(self.concurrency)
+
+                    async def run(index: int, start: int, end: int) -> str:
+                        nonlocal uploaded
+                        async with semaphore:
+                            ext, content = await self._encode(samples[start:end])
+                            uploaded += len(content)
+                            return await self._transcribe_bytes(f"segment-{index}.{ext}", content)
+
+                    tasks = [asyncio.create_task(run(i, s, e)) for i, (s, e) in enumerate(segments)]
+                    try:
+                        previous = ""
+                        for index, task in enumerate(tasks):
+                            text = await task
+                            deduped = drop_overlap(previous, text) if index else text.strip()
+                            previous = text
+                            parts.append(deduped)
+                            yield index, deduped
+                    finally:
+                        for task in tasks:
+                            task.cancel()
+            except Exception as e:
+                print(f"Groq STT Error: {e}")
+                raise e
+            finally:
+                del samples  # Release the memory map before the directory goes away
+
+            full_text = " ".join(p for p in parts if p)
+            self.metrics.record(original_size, uploaded, silent=silent, trimmed_seconds=trimmed_seconds)
+            await self.cache.aset(CACHE_TOOL, self._cache_args("upload_sha256", upload_digest), full_text)
+            if pcm_digest:
+                await self.cache.aset(CACHE_TOOL, self._cache_args("pcm_sha256", pcm_digest), full_text)
 
     async def transcribe(self, file: UploadFile) -> str:
         """
         Transcribe audio using Groq API.
         """
-        # Read file content
-        audio_content = await file.read()
-        
-        # Groq expects a tuple (filename, bytes) or a file-like object
-        # We wrap it in BytesIO and give it a name
-        audio_file = (file.filename or "audio.wav", audio_content)
-
-        try:
-            transcription = self.client.audio.transcriptions.create(
-                file=audio_file,
-                model="distil-whisper-large-v3-en", # Groq's fast whisper model
-                response_format="json",
-                language="en",
-                temperature=0.0
-            )
-            return transcription.text
-        except Exception as e:
-            print(f"Groq STT Error: {e}")
-            raise e
+        parts = [text async for _, text in self.transcribe_stream(file)]
+        return " ".join(p for p in parts if p)
+
+    async def aclose(self):
+        await self.client.close()
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _wav_to_pcm(path: str, raw_path: str):
+    """ffmpeg-less fallback: WAV -> 16 kHz mono int16, one second at a time."""
+    with wave.open(path, "rb") as wav, open(raw_path, "wb") as out:
+        if wav.getsampwidth() != 2:
+            raise ValueError("Only 16-bit WAV can be decoded without ffmpeg.")
+        channels, rate = wav.getnchannels(), wav.getframerate()
+        while frames := wav.readframes(rate):
+            block = np.frombuffer(frames, dtype="<i2").reshape(-1, channels).mean(axis=1)
+            if rate != SAMPLE_RATE:
+                n_out = max(1, round(len(block) * SAMPLE_RATE / rate))
+                block = np.interp(np.arange(n_out) * rate / SAMPLE_RATE, np.arange(len(block)), block)
+            out.write(np.round(block).astype("<i2").tobytes())
+
 
 @lru_cache()
 def get_stt_service() -> STTService:
-    return STTService(get_settings())
\ No newline at end of file
+    return STTService(get_settings())
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from langchain_core.prompts.chat import ChatPromptTemplate
+
+from ..core.config import Settings, get_settings
+from ..core.llm_factory import get_llm_factory
+from ..models.chat_models import Message
+from .cache_service import _MISSING, get_tool_cache
+
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_TITLE = "New Chat"
+CACHE_TOOL = "chat_title"
+
+# Openers that carry no topic; the chat gets a generic title until there's more to go on
+_SMALL_TALK = {
+    "hi", "hii", "hello", "hey", "hey there", "hello there", "hi there", "yo", "sup", "hola", "namaste",
+    "good morning", "good afternoon", "good evening", "how are you", "whats up", "what's up",
+    "thanks", "thank you", "ok", "okay", "test", "testing",
+}
+_LEADING_PHRASES = re.compile(
+    r"^(?:(?:hi|hello|hey)[,!.\s]+)?(?:please\s+|can you\s+|could you\s+|would you\s+|pls\s+)?"
+    r"(?:tell me about|tell me|explain|describe|show me|give me|help me(?: with)?|what is|what are|what's|"
+    r"who is|who was|define|i want to know about|i need)?\s*",
+    re.IGNORECASE,
+)
+_SMALL_WORDS = {"a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "vs", "at", "by"}
+_WORD_RE = re.compile(r"[\w'+#.-]+")
+# Words that never make a title informative on their own
+_STOPWORDS = _SMALL_WORDS | {
+    "i", "me", "my", "you", "your", "we", "it", "its", "this", "that", "these", "those", "there", "here",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "can", "could", "will", "would", "should",
+    "what", "why", "how", "when", "where", "who", "which", "yes", "no", "not", "ok", "okay", "cool", "nice",
+    "great", "fine", "good", "bad", "sure", "please", "thanks", "fix", "make", "help", "more", "again", "some",
+    "thing", "stuff", "something", "anything", "one", "about", "so", "just", "really", "very", "now", "then",
+}
+MIN_CONTENT_WORDS = 2
+MIN_TITLE_CHARS = 8
+
+
+def conversation_text(messages: List[Message], last: int = 4, limit: int = 1000) -> str:
+    text_parts = []
+    for msg in messages[-last:]:
+        for item in msg.content:
+            if item.type == 'text':
+                text_parts.append(item.value)
+    return " ".join(text_parts)[:limit]
+
+
+def conversation_digest(text: str) -> str:
+    return hashlib.sha256(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+
+def _title_case(words: List[str]) -> str:
+    out = []
+    for i, word in enumerate(words):
+        if i and word.lower() in _SMALL_WORDS:
+            out.append(word.lower())
+        elif word.isupper() or any(c.isupper() for c in word[1:]):
+            out.append(word)  # Keep acronyms / brand casing (API, iPhone)
+        else:
+            out.append(word[:1].upper() + word[1:])
+    return " ".join(out)
+
+
+def heuristic_title(messages: List[Message], max_words: int = 6) -> Optional[str]:
+    """
+    Extractive title for trivial chats: small talk, or a single short user
+    question whose topic can be lifted verbatim. The lifted title needs at
+    least MIN_CONTENT_WORDS non-stopwords (one of 4+ characters) and
+    MIN_TITLE_CHARS characters. None means "ask the LLM".
+    """
+    user_texts = [
+        item.value.strip() for msg in messages if msg.sender == "user"
+        for item in msg.content if item.type == "text" and item.value.strip()
+    ]
+    if not user_texts:
+        return None
+
+    normalized = [" ".join(_WORD_RE.findall(t.lower())).strip(" .") for t in user_texts]
+    if all(n in _SMALL_TALK or not n for n in normalized):
+        return "Casual Greeting"
+
+    topics = [t for t, n in zip(user_texts, normalized) if n not in _SMALL_TALK]
+    if len(topics) != 1 or "\n" in topics[0]:
+        return None
+
+    topic = _LEADING_PHRASES.sub("", topics[0].strip(), count=1)
+    words = [w.strip(".") for w in _WORD_RE.findall(topic)]
+    words = [w for w in words if w]
+    if len(words) > 1 and words[0].lower() in ("a", "an", "the"):
+        words = words[1:]
+    if not words or len(words) > max_words:
+        return None
+
+    content = [w for w in words if w.lower() not in _STOPWORDS and (len(w) > 1 or w.isdigit())]
+    if len(content) < MIN_CONTENT_WORDS or not any(len(w) >= 4 for w in content):
+        return None
+    title = _title_case(words)
+    return title if len(title) >= MIN_TITLE_CHARS else None
+
+
+class TitleGenerator:
+    """
+    Tiered chat titles: digest cache -> extractive heuristic -> LLM.
+    """
+
+    def __init__(self, settings: Settings):
+        self.llm_factory = get_llm_factory()
+        self.cache = get_tool_cache()
+        self.batch_concurrency = settings.TITLE_BATCH_CONCURRENCY
+        self._lock = threading.Lock()
+        self.counters = {"cache": 0, "heuristic": 0, "llm": 0, "default": 0}
+        self.title_prompt = ChatPromptTemplate.from_messages([
+            ("system", "Generate a 3-5 word title for this chat, max words should be 10. No quotes."),
+            ("user", "{context}")
+        ])
+
+    def _count(self, tier: str):
+        with self._lock:
+            self.counters[tier] += 1
+
+    async def generate(self, messages: List[Message]) -> str:
+        try:
+            conversation_summary = conversation_text(messages)
+            if not conversation_summary:
+                self._count("default")
+                return DEFAULT_TITLE
+
+            args = {"digest": conversation_digest(conversation_summary)}
+            cached = await self.cache.aget(CACHE_TOOL, args)
+            if cached is not _MISSING:
+                self._count("cache")
+                return cached
+
+            title = heuristic_title(messages)
+            if title:
+                self._count("heuristic")
+            else:
+                model = self.llm_factory.get_tooling_model()
+                chain = self.title_prompt | model
+                response = await chain.ainvoke({"context": conversation_summary})
+                title = response.content[:100].strip().replace('"', '')
+                self._count("llm")
+
+            if title:
+                await self.cache.aset(CACHE_TOOL, args, title)
+            return title or DEFAULT_TITLE
+        except Exception as e:
+            print(f"Error generating title: {e}")
+            self._count("default")
+            return DEFAULT_TITLE
+
+    async def generate_many(self, conversations: List[List[Message]]) -> List[str]:
+        """Titles for many chats, at most batch_concurrency at a time, in input order."""
+        semaphore = asyncio.Semaphore(max(1, self.batch_concurrency))
+
+        async def run(messages: List[Message]) -> str:
+            async with semaphore:
+                return await self.generate(messages)
+
+        return list(await asyncio.gather(*(run(messages) for messages in conversations)))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self.counters)
+        total = sum(stats.values())
+        stats["llm_rate"] = round(stats["llm"] / total, 3) if total else 0.0
+        return stats
+
+
+@lru_cache()
+def get_title_generator() -> TitleGenerator:
+    return TitleGenerator(get_settings())
@@ -1,89 +1,195 @@
 import json
-from typing import Dict, Any, List
+import asyncio
+from typing import Dict, Any, List, Optional
 from urllib.parse import urlparse
-from langchain_core.tools import Tool
-from langchain_google_community import GoogleSearchAPIWrapper
+
+import httpx
+from langchain_core.tools import StructuredTool
 from ..core.config import get_settings
+from .cache_service import get_tool_cache
 
 class ToolsService:
     def __init__(self):
         settings = get_settings()
         self._search_available = False
-        self._search_wrapper = None
         self._error_msg = ""
+        self._api_key = settings.GOOGLE_API_KEY
+        self._cse_id = settings.GOOGLE_CSE_ID
+        # Overridable so a local HTTP stub can stand in for the CSE endpoint
+        self._endpoint = settings.GOOGLE_CSE_ENDPOINT
+        self._timeout = httpx.Timeout(settings.SEARCH_HTTP_TIMEOUT)
+        self._limits = httpx.Limits(
+            max_connections=settings.SEARCH_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SEARCH_MAX_CONNECTIONS,
+            keepalive_expiry=30.0,
+        )
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._sync_client: Optional[httpx.Client] = None
+        self.cache = get_tool_cache()
 
-        if settings.GOOGLE_API_KEY and settings.GOOGLE_CSE_ID:
-            try:
-                # Reduced k to 5 for speed and focus
-                self._search_wrapper = GoogleSearchAPIWrapper(
-                    google_api_key=settings.GOOGLE_API_KEY,
-                    google_cse_id=settings.GOOGLE_CSE_ID,
-                    k=5 
-                )
-                self._search_available = True
-            except Exception as e:
-                self._error_msg = f"Init Failed: {e}"
+        if self._api_key and self._cse_id:
+            self._search_available = True
         else:
             self._error_msg = "Keys missing."
 
-    def get_search_tool(self) -> Tool:
-        return Tool(
-            name="google_search",
+    # --- Pooled HTTP Clients ---
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """Shared keep-alive pool for all async searches (created lazily)."""
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+        return self._async_client
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        if self._sync_client is None or self._sync_client.is_closed:
+            self._sync_client = httpx.Client(timeout=self._timeout, limits=self._limits)
+        return self._sync_client
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+        if self._sync_client is not None:
+            self._sync_client.close()
+
+    # --- Tool ---
+
+    def get_search_tool(self) -> StructuredTool:
+        return StructuredTool.from_function(
             func=self.perform_search_full,
-            description="Returns JSON with summary, sources, and found images.",
+            coroutine=self.aperform_search_full,
+            name="google_search",
+            description=(
+                "Returns JSON with summary, sources, and found images. "
+                "Input: query string. Optionally 'queries' to search several related queries at once."
+            ),
         )
 
-    def perform_search_full(self, query: str) -> str:
-        print(f"Tool executing for: {query}") 
-        result = self.perform_search(query)
+    def perform_search_full(self, query: str, queries: Optional[List[str]] = None) -> str:
+        print(f"Tool executing for: {query}")
+        all_queries = self._collect_queries(query, queries)
+        results = [self.perform_search(q) for q in all_queries]
         # Ensure we return a STRING, not a dict
+        return json.dumps(self._merge_results(results))
+
+    async def aperform_search_full(self, query: str, queries: Optional[List[str]] = None) -> str:
+        print(f"Tool executing for: {query}")
+        result = await self.aperform_search_many(self._collect_queries(query, queries))
         return json.dumps(result)
 
+    @staticmethod
+    def _collect_queries(query: str, queries: Optional[List[str]]) -> List[str]:
+        collected = []
+        for q in [query] + list(queries or []):
+            q = (q or "").strip()
+            if q and q not in collected:
+                collected.append(q)
+        return collected
+
+    # --- Search ---
+
+    def _params(self, query: str) -> Dict[str, Any]:
+        return {"key": self._api_key, "cx": self._cse_id, "q": query, "num": 5}
+
+    @staticmethod
+    def _is_cacheable(result: Dict[str, Any]) -> bool:
+        # Only cache real hits, never errors or empty results
+        return bool(result.get("sources"))
+
     def perform_search(self, query: str) -> Dict[str, Any]:
+        return self.cache.get_or_compute(
+            "google_search", {"query": query}, lambda: self._perform_search(query), self._is_cacheable
+        )
+
+    async def aperform_search(self, query: str) -> Dict[str, Any]:
+        return await self.cache.aget_or_compute(
+            "google_search", {"query": query}, lambda: self._aperform_search(query), self._is_cacheable
+        )
+
+    def _perform_search(self, query: str) -> Dict[str, Any]:
         if not self._search_available:
             return {"summary": self._error_msg, "sources": [], "images": []}
-        
+
         try:
-            raw_results = self._search_wrapper.results(query, num_results=5)
-            
-            if not raw_results: 
-                return {"summary": "No results found on the web.", "sources": [], "images": []}
-
-            sources = []
-            snippets = []
-            found_images = []
-
-            for i, res in enumerate(raw_results):
-                title = res.get("title", "Unknown")
-                link = res.get("link", "#")
-                snippet = res.get("snippet", "No description available.")
-                
-                try:
-                    domain = urlparse(link).netloc
-                    icon_url = f"https://www.google.com/s2/favicons?domain={domain}"
-                except: 
-                    icon_url = ""
-
-                image_url = None
-                pagemap = res.get("pagemap", {})
-                if "cse_image" in pagemap and len(pagemap["cse_image"]) > 0:
-                    image_url = pagemap["cse_image"][0].get("src")
-                elif "og:image" in pagemap and len(pagemap["og:image"]) > 0:
-                    image_url = pagemap["og:image"][0].get("src")
-
-                sources.append({"title": title, "uri": link, "icon": icon_url, "citationIndices": []})
-                snippets.append(f"Source [{i+1}] {title}: {snippet}")
-                
-                if image_url and len(found_images) < 2:
-                    found_images.append({"url": image_url, "source_index": i+1, "alt": title})
-
-            summary_text = "\n\n".join(snippets)
-            print(summary_text, sources, found_images)
-
-            return {
-                "summary": summary_text, 
-                "sources": sources, 
-                "images": found_images
-            }
+            response = self.sync_client.get(self._endpoint, params=self._params(query))
+            response.raise_for_status()
+            return self._format_results(response.json().get("items", []))
         except Exception as e:
-            return {"summary": f"Search Error: {e}", "sources": [], "images": []}
\ No newline at end of file
+            return {"summary": f"Search Error: {e}", "sources": [], "images": []}
+
+    async def _aperform_search(self, query: str) -> Dict[str, Any]:
+        if not self._search_available:
+            return {"summary": self._error_msg, "sources": [], "images": []}
+
+        try:
+            response = await self.async_client.get(self._endpoint, params=self._params(query))
+            response.raise_for_status()
+            return self._format_results(response.json().get("items", []))
+        except Exception as e:
+            return {"summary": f"Search Error: {e}", "sources": [], "images": []}
+
+    async def aperform_search_many(self, queries: List[str]) -> Dict[str, Any]:
+        """Issues several queries concurrently over the shared pool and merges them."""
+        if not queries:
+            return {"summary": "No query provided.", "sources": [], "images": []}
+        results = await asyncio.gather(*[self.aperform_search(q) for q in queries])
+        return self._merge_results(list(results))
+
+    def _format_results(self, raw_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if not raw_results:
+            return {"summary": "No results found on the web.", "sources": [], "images": []}
+
+        sources = []
+        snippets = []
+        found_images = []
+
+        for i, res in enumerate(raw_results[:5]):
+            title = res.get("title", "Unknown")
+            link = res.get("link", "#")
+            snippet = res.get("snippet", "No description available.")
+
+            try:
+                domain = urlparse(link).netloc
+                icon_url = f"https://www.google.com/s2/favicons?domain={domain}"
+            except:
+                icon_url = ""
+
+            image_url = None
+            pagemap = res.get("pagemap", {})
+            if "cse_image" in pagemap and len(pagemap["cse_image"]) > 0:
+                image_url = pagemap["cse_image"][0].get("src")
+            elif "og:image" in pagemap and len(pagemap["og:image"]) > 0:
+                image_url = pagemap["og:image"][0].get("src")
+
+            sources.append({"title": title, "uri": link, "icon": icon_url, "citationIndices": []})
+            snippets.append(f"Source [{i+1}] {title}: {snippet}")
+
+            if image_url and len(found_images) < 2:
+                found_images.append({"url": image_url, "source_index": i+1, "alt": title})
+
+        return {
+            "summary": "\n\n".join(snippets),
+            "sources": sources,
+            "images": found_images
+        }
+
+    @staticmethod
+    def _merge_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Combines per-query results, renumbering sources so citations stay unique."""
+        if len(results) == 1:
+            return results[0]
+
+        summaries, sources, images = [], [], []
+        for result in results:
+            offset = len(sources)
+            summary = result.get("summary", "")
+            for i in range(len(result.get("sources", [])), 0, -1):
+                summary = summary.replace(f"Source [{i}]", f"Source [{i + offset}]")
+            summaries.append(summary)
+            sources.extend(result.get("sources", []))
+            for img in result.get("images", []):
+                if len(images) < 2:
+                    images.append({**img, "source_index": img.get("source_index", 0) + offset})
+
+        return {"summary": "\n\n".join(s for s in summaries if s), "sources": sources, "images": images}
@@ -0,0 +1,120 @@
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List
+
+_WORD_RE = re.compile(r"\w+")
+
+# Common words that carry no signal for retrieval
+_STOPWORDS = {
+    "the", "a", "an", "and", "or", "of", "to", "in", "on", "is", "it", "that", "this",
+    "for", "with", "as", "was", "what", "how", "does", "do", "about", "video", "i", "you",
+}
+
+
+def _tokens(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+def _entry_fields(entry: Any) -> tuple:
+    """Transcript entries are dicts in older youtube-transcript-api releases, objects in newer ones."""
+    if isinstance(entry, dict):
+        return entry.get("text", ""), float(entry.get("start", 0.0)), float(entry.get("duration", 0.0))
+    return getattr(entry, "text", ""), float(getattr(entry, "start", 0.0)), float(getattr(entry, "duration", 0.0))
+
+
+def build_chunks(entries: List[Any], chunk_chars: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Groups raw transcript lines into timestamped chunks of roughly chunk_chars.
+    The result is plain JSON so it can live in the tool cache.
+    """
+    chunks: List[Dict[str, Any]] = []
+    parts: List[str] = []
+    size = 0
+    start = end = 0.0
+
+    for entry in entries:
+        text, entry_start, duration = _entry_fields(entry)
+        text = " ".join(text.split())
+        if not text:
+            continue
+        if not parts:
+            start = entry_start
+        parts.append(text)
+        size += len(text) + 1
+        end = entry_start + duration
+        if size >= chunk_chars:
+            chunks.append({"start": start, "end": end, "text": " ".join(parts)})
+            parts, size = [], 0
+
+    if parts:
+        chunks.append({"start": start, "end": end, "text": " ".join(parts)})
+    return chunks
+
+
+def select_chunks(chunks: List[Dict[str, Any]], query: str | None, top_k: int, token_budget: int) -> List[Dict[str, Any]]:
+    """
+    Picks the top_k chunks most relevant to the query (BM25 over chunk words)
+    that fit in token_budget, returned in timeline order. Without a query the
+    opening of the video is returned instead.
+    """
+    if not chunks:
+        return []
+
+    query_terms = _tokens(query or "")
+    if query_terms:
+        docs = [Counter(_tokens(c["text"])) for c in chunks]
+        avg_len = sum(sum(d.values()) for d in docs) / len(docs) or 1.0
+        n = len(docs)
+        k1, b = 1.5, 0.75
+
+        def score(doc: Counter) -> float:
+            doc_len = sum(doc.values())
+            total = 0.0
+            for term in set(query_terms):
+                tf = doc.get(term, 0)
+                if not tf:
+                    continue
+                df = sum(1 for d in docs if term in d)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                total += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avg_len))
+            return total
+
+        scores = [score(d) for d in docs]
+        ranked = [i for i in sorted(range(n), key=lambda i: scores[i], reverse=True) if scores[i] > 0]
+    else:
+        ranked = []
+
+    # Nothing matched (or no question): fall back to the opening of the video
+    if not ranked:
+        ranked = list(range(len(chunks)))
+
+    picked, used = [], 0
+    for i in ranked:
+        cost = estimate_tokens(chunks[i]["text"])
+        if used + cost > token_budget:
+            continue
+        picked.append(i)
+        used += cost
+        if len(picked) >= top_k:
+            break
+
+    return [chunks[i] for i in sorted(picked)]
+
+
+def render_chunks(chunks: List[Dict[str, Any]], total_chunks: int) -> str:
+    lines = [f"[{format_timestamp(c['start'])}-{format_timestamp(c['end'])}] {c['text']}" for c in chunks]
+    header = f"(Showing {len(chunks)} of {total_chunks} transcript segments, with timestamps)"
+    return header + "\n" + "\n".join(lines)
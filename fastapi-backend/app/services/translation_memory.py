@@ -0,0 +1,226 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import logging
+import unicodedata
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from ..core.config import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# Hit counts are buffered in memory and written in one batch by a background task
+HIT_FLUSH_INTERVAL_SECONDS = 30.0
+
+
+def normalize_source(text: str) -> str:
+    """NFC + collapsed whitespace. Case is kept: it changes the translation."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def normalize_language(language: str) -> str:
+    return " ".join(language.lower().split())
+
+
+class TranslationMemory:
+    """
+    (normalized source, target language) -> translation.
+    An in-memory LRU in front of a SQLite table that also counts hits, so
+    the most frequently reused entries can be pre-warmed at startup. Hits
+    are only counted in memory; run_flusher() writes them in one batch every
+    HIT_FLUSH_INTERVAL_SECONDS (and at shutdown) from a worker thread. Async
+    callers use aget/aset, so a memory hit never touches the disk and disk
+    reads and writes never run on the event loop.
+    """
+
+    def __init__(self, db_path: Optional[str], max_items: int = 2048):
+        self.max_items = max_items
+        self._memory: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "hit_flushes": 0}
+        self._pending_hits: Counter = Counter()
+
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS translation_memory ("
+                    "source TEXT NOT NULL, language TEXT NOT NULL, translation TEXT NOT NULL, "
+                    "hits INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL, "
+                    "PRIMARY KEY (source, language))"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS translation_memory_hits ON translation_memory (hits)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"[TranslationMemory] Disk tier disabled: {e}")
+                self._db = None
+
+    def _key(self, text: str, language: str) -> Tuple[str, str]:
+        return normalize_source(text), normalize_language(language)
+
+    def _get_memory(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                self._count_hit(key)
+            return value
+
+    def _get_disk(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            row = None
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT translation FROM translation_memory WHERE source = ? AND language = ?", key
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.error(f"[TranslationMemory] Disk read failed: {e}")
+            if row is not None:
+                self._put_memory(key, row[0])
+                self.counters["disk_hits"] += 1
+                self._count_hit(key)
+                return row[0]
+
+            self.counters["misses"] += 1
+            return None
+
+    def get(self, text: str, language: str) -> Optional[str]:
+        key = self._key(text, language)
+        if not key[0]:
+            return None
+        value = self._get_memory(key)
+        return value if value is not None else self._get_disk(key)
+
+    async def aget(self, text: str, language: str) -> Optional[str]:
+        key = self._key(text, language)
+        if not key[0]:
+            return None
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+        return await asyncio.to_thread(self._get_disk, key)
+
+    def set(self, text: str, language: str, translation: str):
+        self.set_many([(text, language, translation)])
+
+    def set_many(self, items: Iterable[Tuple[str, str, str]]):
+        """Stores (text, language, translation) triples; the disk tier in one transaction."""
+        rows = []
+        for text, language, translation in items:
+            key = self._key(text, language)
+            if key[0] and translation and translation.strip():
+                rows.append((*key, translation))
+        if not rows:
+            return
+
+        with self._lock:
+            for source, language, translation in rows:
+                self._put_memory((source, language), translation)
+            if self._db is not None:
+                now = time.time()
+                try:
+                    self._db.executemany(
+                        "INSERT INTO translation_memory (source, language, translation, hits, updated_at) "
+                        "VALUES (?, ?, ?, 0, ?) ON CONFLICT (source, language) DO UPDATE SET "
+                        "translation = excluded.translation, updated_at = excluded.updated_at",
+                        [(*row, now) for row in rows],
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"[TranslationMemory] Disk write failed: {e}")
+
+    async def aset(self, text: str, language: str, translation: str):
+        await asyncio.to_thread(self.set, text, language, translation)
+
+    async def aset_many(self, items: Iterable[Tuple[str, str, str]]):
+        await asyncio.to_thread(self.set_many, list(items))
+
+    def prewarm(self, limit: Optional[int] = None) -> int:
+        """Loads the most frequently hit entries into memory. Returns how many were loaded."""
+        if self._db is None:
+            return 0
+        limit = min(limit or self.max_items, self.max_items)
+        with self._lock:
+            self._flush_hits()
+            try:
+                rows = self._db.execute(
+                    "SELECT source, language, translation FROM translation_memory "
+                    "ORDER BY hits DESC, updated_at DESC LIMIT ?", (limit,)
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.error(f"[TranslationMemory] Pre-warm failed: {e}")
+                return 0
+            # Least frequent first, so the hottest entries end up most recently used
+            for source, language, translation in reversed(rows):
+                self._put_memory((source, language), translation)
+        return len(rows)
+
+    def _count_hit(self, key: Tuple[str, str]):
+        if self._db is not None:
+            self._pending_hits[key] += 1  # Written by the flusher, never on the request path
+
+    def _flush_hits(self):
+        """Writes buffered hit counts in one transaction. Caller holds the lock."""
+        if self._db is None or not self._pending_hits:
+            return
+        pending, self._pending_hits = self._pending_hits, Counter()
+        try:
+            self._db.executemany(
+                "UPDATE translation_memory SET hits = hits + ? WHERE source = ? AND language = ?",
+                [(count, *key) for key, count in pending.items()],
+            )
+            self._db.commit()
+            self.counters["hit_flushes"] += 1
+        except sqlite3.Error as e:
+            logger.error(f"[TranslationMemory] Hit count flush failed: {e}")
+
+    def flush_hits(self):
+        with self._lock:
+            self._flush_hits()
+
+    async def run_flusher(self, interval: float = HIT_FLUSH_INTERVAL_SECONDS):
+        """Background task: flushes buffered hit counts every `interval` seconds, off the event loop."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush_hits)
+            except Exception as e:
+                logger.error(f"[TranslationMemory] Background flush failed: {e}")
+
+    def _put_memory(self, key: Tuple[str, str], translation: str):
+        self._memory[key] = translation
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)  # Its pending hit count is still flushed by key
+            self.counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self.counters)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        stats["memory_items"] = len(self._memory)
+        stats["pending_hits"] = sum(self._pending_hits.values())
+        stats["disk_items"] = 0
+        if self._db is not None:
+            with self._lock:
+                try:
+                    stats["disk_items"] = self._db.execute("SELECT COUNT(*) FROM translation_memory").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+        return stats
+
+
+@lru_cache()
+def get_translation_memory() -> TranslationMemory:
+    settings: Settings = get_settings()
+    return TranslationMemory(settings.TRANSLATION_MEMORY_PATH, max_items=settings.TRANSLATION_MEMORY_ITEMS)
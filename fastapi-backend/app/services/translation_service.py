@@ -1,11 +1,57 @@
 # app/services/translation_service.py
+import asyncio
+import logging
+import re
 from functools import lru_cache
+from typing import Dict, List
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
 from ..core.config import Settings, get_settings
 from ..core.llm_factory import get_llm_factory
+from .translation_memory import get_translation_memory
+
+logger = logging.getLogger("uvicorn.error")
+
+# Batch protocol: every segment is introduced by its own marker, e.g. <<<7>>>.
+# Markers survive the model joining or re-wrapping lines, so parsing never
+# depends on line structure.
+_MARKER = "<<<{}>>>"
+_MARKER_RE = re.compile(r"<<<\s*(\d+)\s*>>>")
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def pack_segments(segments: List[str], token_budget: int, max_segments: int) -> List[List[int]]:
+    """Groups segment indexes into packs that fit the token budget (oversized segments go alone)."""
+    packs: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for i, segment in enumerate(segments):
+        cost = _estimate_tokens(segment) + 4  # Marker overhead
+        if current and (used + cost > token_budget or len(current) >= max_segments):
+            packs.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+def parse_packed(output: str) -> Dict[int, str]:
+    """Maps marker number -> translated text. Unknown or repeated markers keep the first occurrence."""
+    parts = _MARKER_RE.split(output)
+    results: Dict[int, str] = {}
+    # parts = [preamble, id, text, id, text, ...]
+    for i in range(1, len(parts) - 1, 2):
+        key = int(parts[i])
+        if key not in results:
+            results[key] = parts[i + 1].strip()
+    return results
 
 
 class TranslationService:
@@ -16,6 +62,10 @@ class TranslationService:
     def __init__(self, settings: Settings):
         factory = get_llm_factory()
         self.llm = factory.get_tooling_model()
+        self.memory = get_translation_memory()
+        self.pack_token_budget = settings.TRANSLATE_PACK_TOKEN_BUDGET
+        self.pack_max_segments = settings.TRANSLATE_PACK_MAX_SEGMENTS
+        self.concurrency = settings.TRANSLATE_CONCURRENCY
 
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """
@@ -28,13 +78,95 @@ class TranslationService:
             ("human", "Target language: {target_language}\n\nText:\n{text}")
         ])
 
+        self.batch_prompt = ChatPromptTemplate.from_messages([
+            ("system", """
+            You are a professional translator.
+            The user's text is a list of independent segments. Each segment starts with a marker like <<<1>>>.
+            Translate every segment into the target language.
+            - Output every marker exactly as given, followed by that segment's translation.
+            - Keep the markers in the same order. Never merge, split, or drop segments.
+            - Keep meaning accurate and tone natural.
+            - Do NOT explain, ONLY return the markers and translations.
+            """),
+            ("human", "Target language: {target_language}\n\n{text}")
+        ])
+
         self.chain = self.prompt | self.llm | StrOutputParser()
+        self.batch_chain = self.batch_prompt | self.llm | StrOutputParser()
 
     async def translate(self, text: str, target_language: str) -> str:
+        cached = await self.memory.aget(text, target_language)
+        if cached is not None:
+            return cached
+
+        translated = await self._translate_llm(text, target_language)
+        await self.memory.aset(text, target_language, translated)
+        return translated
+
+    async def _translate_llm(self, text: str, target_language: str) -> str:
         return await self.chain.ainvoke(
             {"text": text, "target_language": target_language}
         )
 
+    # --- Batch ---
+
+    async def _translate_pack(self, segments: List[str], target_language: str) -> List[str]:
+        if len(segments) == 1:
+            return [await self._translate_llm(segments[0], target_language)]
+
+        packed = "\n".join(f"{_MARKER.format(i + 1)}\n{segment}" for i, segment in enumerate(segments))
+        output = await self.batch_chain.ainvoke({"text": packed, "target_language": target_language})
+        parsed = parse_packed(output)
+
+        # Anything the model dropped or emptied is retried on its own
+        missing = [i for i in range(len(segments)) if not parsed.get(i + 1)]
+        if missing:
+            logger.warning(f"[Translate] {len(missing)}/{len(segments)} segments missing from pack, retrying singly")
+            retried = await asyncio.gather(*(self._translate_llm(segments[i], target_language) for i in missing))
+            for i, text in zip(missing, retried):
+                parsed[i + 1] = text
+        return [parsed[i + 1] for i in range(len(segments))]
+
+    async def translate_batch(self, segments: List[str], target_languages: List[str]) -> Dict[str, List[str]]:
+        """
+        Translates every segment into every target language. Identical
+        segments are translated once, translation-memory hits skip the LLM,
+        the rest are packed into as few LLM calls as the token budget allows,
+        and packs run concurrently.
+        Returns {language: translations aligned with `segments`}.
+        """
+        languages = list(dict.fromkeys(target_languages))
+        unique = list(dict.fromkeys(s for s in segments if s.strip()))
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+
+        # Translation memory first; only misses are packed and sent to the LLM
+        translated: Dict[str, Dict[str, str]] = {language: {} for language in languages}
+        jobs = []
+        for language in languages:
+            todo = []
+            for segment in unique:
+                cached = await self.memory.aget(segment, language)
+                if cached is not None:
+                    translated[language][segment] = cached
+                else:
+                    todo.append(segment)
+            for pack in pack_segments(todo, self.pack_token_budget, self.pack_max_segments):
+                jobs.append((language, [todo[i] for i in pack]))
+
+        async def run(language: str, pack: List[str]):
+            async with semaphore:
+                return language, pack, await self._translate_pack(pack, language)
+
+        results = []
+        for language, pack, texts in await asyncio.gather(*(run(l, p) for l, p in jobs)):
+            for segment, text in zip(pack, texts):
+                translated[language][segment] = text
+                results.append((segment, language, text))
+        await self.memory.aset_many(results)
+
+        # Blank segments pass through untouched
+        return {language: [translated[language].get(s, s) for s in segments] for language in languages}
+
 
 @lru_cache()
 def get_translation_service() -> TranslationService:
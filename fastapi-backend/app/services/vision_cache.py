@@ -0,0 +1,187 @@
+import base64
+import hashlib
+import io
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from ..core.config import Settings, get_settings
+
+_WORD_CHUNK_RE = re.compile(r"\S+\s*|\s+")
+
+HASH_SIZE = 8  # 8x8 difference hash -> 64 bits
+FINE_HASH_SIZE = 16  # 16x16 -> 256 bits, must also agree before a near match is accepted
+MAX_SCOPES_PER_ENTRY = 16  # Sessions an answer can be near-matched from
+
+
+def _dhash(gray: "Image.Image", size: int) -> int:
+    """One bit per horizontal gradient of the image shrunk to (size+1) x size."""
+    pixels = list(gray.resize((size + 1, size), getattr(Image, "Resampling", Image).BILINEAR).getdata())
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def difference_hash(image_data: bytes, size: int = HASH_SIZE) -> int:
+    """
+    dHash: grayscale, shrink, one bit per horizontal gradient.
+    Stable across re-encoding, resizing and mild compression.
+    """
+    return _dhash(Image.open(io.BytesIO(image_data)).convert("L"), size)
+
+
+def image_signature(image_data: bytes) -> str:
+    """
+    "p:<sha256 of decoded pixels>:<64-bit dHash>:<256-bit dHash>".
+    The pixel digest is the exact-match key (independent of container and
+    metadata); the two hashes are only used to confirm near duplicates.
+    """
+    img = Image.open(io.BytesIO(image_data))
+    img.load()
+    pixel_digest = hashlib.sha256(f"{img.mode}:{img.size}:".encode("ascii") + img.tobytes()).hexdigest()
+    gray = img.convert("L")
+    return f"p:{pixel_digest}:{_dhash(gray, HASH_SIZE):016x}:{_dhash(gray, FINE_HASH_SIZE):064x}"
+
+
+def image_fingerprint(image_url: str) -> str:
+    """
+    Pixel signature (see image_signature) for inline (data URI / base64) images.
+    Remote URLs we can't decode are fingerprinted by the URL itself ("u:<sha1>").
+    """
+    if not image_url.startswith(("http://", "https://")):
+        encoded = image_url.split(",", 1)[1] if "," in image_url else image_url
+        try:
+            encoded += "=" * ((4 - len(encoded) % 4) % 4)
+            return image_signature(base64.b64decode(encoded))
+        except Exception:
+            pass
+    return f"u:{hashlib.sha1(image_url.encode('utf-8')).hexdigest()}"
+
+
+def normalize_prompt(prompt: Optional[str]) -> str:
+    return " ".join((prompt or "").lower().split()).rstrip("?.! ")
+
+
+def replay_chunks(text: str, words_per_chunk: int = 3) -> Iterator[str]:
+    """Splits a cached answer back into small word-aligned chunks for streaming."""
+    words = _WORD_CHUNK_RE.findall(text)
+    for i in range(0, len(words), words_per_chunk):
+        yield "".join(words[i:i + words_per_chunk])
+
+
+def _hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def _fingerprints_match(a: Sequence[str], b: Sequence[str], max_distance: int) -> bool:
+    if len(a) != len(b):
+        return False
+    for fa, fb in zip(a, b):
+        if fa == fb:
+            continue
+        pa, pb = fa.split(":"), fb.split(":")
+        if pa[0] != "p" or pb[0] != "p" or len(pa) != 4 or len(pb) != 4:
+            return False
+        # Coarse hashes collide easily (e.g. text screenshots), so the fine one must agree too
+        if _hamming(pa[2], pb[2]) > max_distance or _hamming(pa[3], pb[3]) > max_distance:
+            return False
+    return True
+
+
+class VisionAnswerCache:
+    """
+    In-memory LRU + TTL cache of vision answers, keyed by model, normalized
+    prompt and the pixel digests of the images. Exact hits (same pixels) are
+    shared by everyone. Near-duplicate hits (coarse and fine image hashes
+    both within max_distance bits) are only served within a scope (the
+    sessions the answer was given to; anonymous requests share one scope),
+    since that's where two different images could collide.
+    """
+
+    def __init__(self, max_items: int = 256, ttl_seconds: int = 24 * 60 * 60, max_distance: int = 4):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        # key -> (expires_at, scopes, model, prompt, fingerprints, answer)
+        self._entries: "OrderedDict[str, Tuple[float, Tuple[str, ...], str, str, Tuple[str, ...], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"exact_hits": 0, "near_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def make_key(model: str, prompt: str, fingerprints: Sequence[str]) -> str:
+        exact = [fp.split(":")[1] if fp.startswith("p:") else fp for fp in fingerprints]
+        return f"{model}|{prompt}|{','.join(exact)}"
+
+    def get(self, model: str, prompt: Optional[str], fingerprints: Sequence[str],
+            scope: Optional[str] = None) -> Optional[str]:
+        scope = scope or ""
+        prompt = normalize_prompt(prompt)
+        key = self.make_key(model, prompt, fingerprints)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.counters["exact_hits"] += 1
+                return entry[5]
+
+            for other_key, (expires_at, e_scopes, e_model, e_prompt, e_fps, answer) in list(self._entries.items()):
+                if expires_at <= now:
+                    del self._entries[other_key]
+                    self.counters["expired"] += 1
+                    continue
+                if scope in e_scopes and e_model == model and e_prompt == prompt and _fingerprints_match(fingerprints, e_fps, self.max_distance):
+                    self._entries.move_to_end(other_key)
+                    self.counters["near_hits"] += 1
+                    return answer
+
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, model: str, prompt: Optional[str], fingerprints: Sequence[str], answer: str,
+            scope: Optional[str] = None):
+        if not answer or not fingerprints:
+            return
+        scope = scope or ""
+        prompt = normalize_prompt(prompt)
+        key = self.make_key(model, prompt, fingerprints)
+        with self._lock:
+            existing = self._entries.get(key)
+            scopes = tuple(s for s in existing[1] if s != scope) if existing else ()
+            scopes = (scopes + (scope,))[-MAX_SCOPES_PER_ENTRY:]
+            self._entries[key] = (time.time() + self.ttl_seconds, scopes, model, prompt, tuple(fingerprints), answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self.counters)
+        hits = stats["exact_hits"] + stats["near_hits"]
+        lookups = hits + stats["misses"]
+        stats["items"] = len(self._entries)
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        return stats
+
+
+def fingerprint_images(images: List[str]) -> List[str]:
+    return [image_fingerprint(img) for img in images]
+
+
+@lru_cache()
+def get_vision_cache() -> VisionAnswerCache:
+    settings: Settings = get_settings()
+    return VisionAnswerCache(
+        max_items=settings.VISION_CACHE_SIZE,
+        ttl_seconds=settings.VISION_CACHE_TTL_SECONDS,
+        max_distance=settings.VISION_CACHE_MAX_DISTANCE,
+    )
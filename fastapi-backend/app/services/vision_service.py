@@ -1,8 +1,12 @@
+import asyncio
 from functools import lru_cache
-from typing import Optional
-from groq import Groq
+from typing import AsyncIterator, List, Optional, Tuple
+
+import httpx
+from groq import AsyncGroq, DefaultAsyncHttpxClient
 
 from ..core.config import Settings, get_settings
+from .vision_cache import get_vision_cache, image_fingerprint
 
 class VisionService:
     """
@@ -13,20 +17,36 @@ class VisionService:
         if not settings.GROQ_API_KEY:
             raise ValueError("GROQ_API_KEY is required for Vision.")
         
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
+        # Async client over one shared keep-alive pool, so calls never block the event loop
+        self.client = AsyncGroq(
+            api_key=settings.GROQ_API_KEY,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings.VISION_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.VISION_MAX_CONNECTIONS,
+                ),
+            ),
+        )
         self.model_name = "llama-3.2-90b-vision-preview"
+        self.cache = get_vision_cache()
 
-    async def analyze_image(self, image_url: str, prompt: Optional[str] = None) -> str:
+    async def analyze_image(self, image_url: str, prompt: Optional[str] = None, scope: Optional[str] = None) -> str:
         """
         Analyzes an image (Base64 URL or HTTP URL).
+        scope: session or user id; near-duplicate cache hits stay within it.
         """
         if not image_url:
             raise ValueError("image_url is required.")
 
         question = prompt or "Describe this image in detail."
 
+        fingerprints = [await asyncio.to_thread(image_fingerprint, image_url)]
+        cached = self.cache.get(self.model_name, question, fingerprints, scope=scope)
+        if cached is not None:
+            return cached
+
         try:
-            completion = self.client.chat.completions.create(
+            completion = await self.client.chat.completions.create(
                 model=self.model_name,
                 messages=[
                     {
@@ -48,11 +68,40 @@ class VisionService:
                 stream=False,
                 stop=None,
             )
-            return completion.choices[0].message.content
+            result = completion.choices[0].message.content
+            self.cache.set(self.model_name, question, fingerprints, result, scope=scope)
+            return result
         except Exception as e:
             print(f"Groq Vision Error: {e}")
             raise e
 
+    async def analyze_many(
+        self, items: List[Tuple[str, Optional[str]]], concurrency: int = 4, scope: Optional[str] = None
+    ) -> AsyncIterator[Tuple[int, Optional[str], Optional[str]]]:
+        """
+        Analyzes (image_url, prompt) pairs with at most `concurrency` calls in
+        flight. Yields (index, result, error) in completion order.
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(index: int, image_url: str, prompt: Optional[str]):
+            async with semaphore:
+                try:
+                    return index, await self.analyze_image(image_url, prompt, scope=scope), None
+                except Exception as e:
+                    return index, None, str(e)
+
+        tasks = [asyncio.create_task(run(i, url, prompt)) for i, (url, prompt) in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def aclose(self):
+        await self.client.close()
+
 @lru_cache()
 def get_vision_service() -> VisionService:
     return VisionService(get_settings())
\ No newline at end of file
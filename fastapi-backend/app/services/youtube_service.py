@@ -1,5 +1,6 @@
 import json
 import logging
+from typing import Optional
 # Import yt_dlp for rich metadata
 import yt_dlp
 # Import the specific class from the library
@@ -7,11 +8,30 @@ from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, No
 from youtube_search import YoutubeSearch
 from langchain_core.tools import StructuredTool
 
+from ..core.config import get_settings
+from .cache_service import get_tool_cache
+from .transcript_index import build_chunks, select_chunks, render_chunks
+
 logger = logging.getLogger("uvicorn.error")
 
+def _is_cacheable(result: str) -> bool:
+    # Never cache failures; they are often transient (rate limits, blocks)
+    return isinstance(result, str) and not result.startswith("ERROR") and not result.startswith('{"error"')
+
 class YoutubeService:
     def __init__(self):
-        pass
+        settings = get_settings()
+        self.cache = get_tool_cache()
+        self.transcript_chunk_chars = settings.TRANSCRIPT_CHUNK_CHARS
+        self.transcript_top_k = settings.TRANSCRIPT_TOP_K
+        self.transcript_token_budget = settings.TRANSCRIPT_TOKEN_BUDGET
+
+    @staticmethod
+    def _extract_video_id(video_id: str) -> str:
+        video_id = str(video_id).strip()
+        if "v=" in video_id: video_id = video_id.split("v=")[1].split("&")[0]
+        if "youtu.be" in video_id: video_id = video_id.split("/")[-1].split("?")[0]
+        return video_id
 
     def get_search_tool(self):
         return StructuredTool.from_function(
@@ -24,7 +44,10 @@ class YoutubeService:
         return StructuredTool.from_function(
             func=self.get_video_transcript,
             name="get_video_transcript",
-            description="Get text transcript of a video. Input: video_id."
+            description=(
+                "Get the transcript segments of a video most relevant to a question, with timestamps. "
+                "Input: video_id and optionally query (what the user wants to know)."
+            )
         )
     
     def get_details_tool(self):
@@ -35,6 +58,12 @@ class YoutubeService:
         )
 
     def search_youtube(self, query: str, max_results: int = 5) -> str:
+        return self.cache.get_or_compute(
+            "search_youtube", {"query": query, "max_results": max_results},
+            lambda: self._search_youtube(query, max_results), _is_cacheable
+        )
+
+    def _search_youtube(self, query: str, max_results: int = 5) -> str:
         try:
             print(f"\n[YouTube Service] 🔍 Searching for: {query}", flush=True)
             results = YoutubeSearch(str(query), max_results=max_results).to_dict()
@@ -57,6 +86,13 @@ class YoutubeService:
             return json.dumps({"error": f"Search failed: {str(e)}"})
 
     def get_video_details(self, video_id: str) -> str:
+        video_id = self._extract_video_id(video_id)
+        return self.cache.get_or_compute(
+            "get_video_details", {"video_id": video_id},
+            lambda: self._get_video_details(video_id), _is_cacheable
+        )
+
+    def _get_video_details(self, video_id: str) -> str:
         """
         Robust metadata fetcher.
         1. Tries yt-dlp (rich data).
@@ -126,30 +162,47 @@ class YoutubeService:
             print(f"[YouTube Service] ❌ Metadata Critical Error: {e}", flush=True)
             return json.dumps({"error": "Could not fetch metadata"})
 
-    def get_video_transcript(self, video_id: str) -> str:
+    def get_video_transcript(self, video_id: str, query: Optional[str] = None) -> str:
+        """
+        Returns the top-k timestamped transcript chunks relevant to the query,
+        within the token budget. The chunked index is cached per video ID, so
+        follow-up questions skip the fetch and chunking.
+        """
+        video_id = self._extract_video_id(video_id)
+        chunks = self.cache.get_or_compute(
+            "get_video_transcript", {"video_id": video_id, "chunk_chars": self.transcript_chunk_chars},
+            lambda: self._build_transcript_index(video_id),
+            lambda v: isinstance(v, list) and len(v) > 0
+        )
+        if isinstance(chunks, str):
+            return chunks  # Error message
+
+        selected = select_chunks(chunks, query, self.transcript_top_k, self.transcript_token_budget)
+        return render_chunks(selected, len(chunks))
+
+    def _fetch_transcript(self, video_id: str):
+        try:
+            return YouTubeTranscriptApi().fetch(video_id)
+        except (TranscriptsDisabled, NoTranscriptFound):
+            raise
+        except Exception:
+            print(f"[YouTube Service] Standard fetch failed. Trying fallback list...", flush=True)
+            for transcript in YouTubeTranscriptApi().list(video_id):
+                return transcript.fetch()
+        return []
+
+    def _build_transcript_index(self, video_id: str):
         try:
             print(f"\n[YouTube Service] 📜 Fetching transcript for ID: {video_id}", flush=True)
-            if "v=" in video_id: video_id = video_id.split("v=")[1].split("&")[0]
-            if "youtu.be" in video_id: video_id = video_id.split("/")[-1].split("?")[0]
+            transcript_list = self._fetch_transcript(video_id)
 
-            transcript_list = []
-            try:
-                transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
-            except Exception:
-                print(f"[YouTube Service] Standard fetch failed. Trying fallback list...", flush=True)
-                transcript_list_obj = YouTubeTranscriptApi.list_transcripts(video_id)
-                for transcript in transcript_list_obj:
-                    transcript_list = transcript.fetch()
-                    break
-
-            if not transcript_list:
+            chunks = build_chunks(list(transcript_list or []), self.transcript_chunk_chars)
+            if not chunks:
                 raise Exception("No transcript data found.")
 
-            full_text = " ".join([t['text'] for t in transcript_list])
-            preview = full_text[:200].replace('\n', ' ')
-            print(f"[YouTube Service] ✅ Success: {preview}...", flush=True)
-            
-            return full_text[:5000] + "... (truncated)"
+            preview = chunks[0]["text"][:200]
+            print(f"[YouTube Service] ✅ Indexed {len(chunks)} chunks: {preview}...", flush=True)
+            return chunks
             
         except TranscriptsDisabled:
             print(f"[YouTube Service] ⚠️ Transcripts Disabled.", flush=True)
@@ -159,4 +212,4 @@ class YoutubeService:
             return "ERROR: NO_TRANSCRIPT_AVAILABLE. (No language found)"
         except Exception as e:
             print(f"[YouTube Service] ❌ Transcript Error: {e}", flush=True)
-            return f"ERROR: Could not fetch transcript. Reason: {str(e)}"
\ No newline at end of file
+            return f"ERROR: Could not fetch transcript. Reason: {str(e)}"
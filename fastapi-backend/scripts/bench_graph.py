@@ -0,0 +1,53 @@
+"""
+Per-turn graph overhead, before and after the compiled-graph registry.
+
+"before" builds and compiles the workflow the way every chat turn used to
+(AgentGraphFactory.create_graph()); "after" is what a turn pays now
+(GraphRegistry.get_graph() on an already compiled graph). No LLM calls are
+made, so only GROQ_API_KEY needs to be set (any value).
+
+    cd fastapi-backend
+    GROQ_API_KEY=x python -m scripts.bench_graph --turns 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.core.agent_graph import AgentGraphFactory
+from app.core.graph_registry import GraphRegistry
+
+
+async def _time_ms(make, turns: int):
+    samples = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        await make()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    return f"mean {statistics.mean(samples):8.3f}ms  median {statistics.median(samples):8.3f}ms  p95 {p95:8.3f}ms"
+
+
+async def main(turns: int):
+    factory = AgentGraphFactory()
+    registry = GraphRegistry(factory)
+    await registry.get_graph()  # Startup compile, paid once
+
+    before = await _time_ms(factory.create_graph, turns)
+    after = await _time_ms(registry.get_graph, turns)
+
+    print(f"turns: {turns}")
+    print(f"before  create_graph() per turn: {_summary(before)}")
+    print(f"after   get_graph() per turn:    {_summary(after)}")
+    print(f"saved per turn: {statistics.mean(before) - statistics.mean(after):.3f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=50)
+    asyncio.run(main(parser.parse_args().turns))
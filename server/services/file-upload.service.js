@@ -83,4 +83,26 @@ const uploadBase64ToGCS = (base64String, folder = 'generated-images') => {
   });
 };
 
-module.exports = { uploadFilesToGCS, uploadBase64ToGCS };
\ No newline at end of file
+/**
+ * Upload raw image bytes (e.g. fetched from the Python image store)
+ */
+const uploadBufferToGCS = (buffer, mimeType, folder = 'generated-images') => {
+  return new Promise((resolve, reject) => {
+    const extension = mimeType.split('/')[1] || 'bin';
+    const blob = bucket.file(`${folder}/${uuidv4()}.${extension}`);
+    const blobStream = blob.createWriteStream({
+      resumable: false,
+      contentType: mimeType,
+    });
+
+    blobStream.on('error', (err) => reject(err));
+
+    blobStream.on('finish', () => {
+      resolve(`https://storage.googleapis.com/${bucket.name}/${blob.name}`);
+    });
+
+    blobStream.end(buffer);
+  });
+};
+
+module.exports = { uploadFilesToGCS, uploadBase64ToGCS, uploadBufferToGCS };
\ No newline at end of file
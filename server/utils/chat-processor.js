@@ -1,4 +1,26 @@
-const { uploadBase64ToGCS } = require('../services/file-upload.service');
+const { uploadBase64ToGCS, uploadBufferToGCS } = require('../services/file-upload.service');
+
+// The Python backend serves generated images from a local, evictable store
+const FASTAPI_URL = process.env.FASTAPI_URL || 'http://127.0.0.1:8000';
+
+// Matches: ![Alt](data:image/...;base64,...)
+const dataImageRegex = /!\[.*?\]\((data:image\/.*?;base64,.*?)\)/;
+// Matches: ![Alt](/api/py/images/<sha256>) (relative or absolute)
+const storeImageRegex = /!\[.*?\]\((?:https?:\/\/[^)\s]*?)?\/api\/py\/images\/([0-9a-f]{64})\)/;
+
+/**
+ * Copies a blob from the Python image store to GCS, so saved chats don't
+ * depend on a container-local cache.
+ */
+const uploadStoreImageToGCS = async (blobId, folder) => {
+  const res = await fetch(`${FASTAPI_URL}/api/py/images/${blobId}`);
+  if (!res.ok) {
+    throw new Error(`Image store returned ${res.status} for ${blobId}`);
+  }
+  const mimeType = res.headers.get('content-type') || 'image/jpeg';
+  const buffer = Buffer.from(await res.arrayBuffer());
+  return uploadBufferToGCS(buffer, mimeType, folder);
+};
 
 const processMessagesForSave = async (messages, userId) => {
   console.log(`[Processor] Scanning ${messages.length} messages for Base64 images...`);
@@ -25,26 +47,25 @@ const processMessagesForSave = async (messages, userId) => {
         } 
         
         // CASE B: Block is 'text' containing Markdown Image (e.g. Agent Generated)
-        // Format: ![Generated Image](data:image/jpeg;base64,...)
-        else if (block.type === 'text' && typeof block.value === 'string' && block.value.includes('data:image')) {
-          let text = block.value.trim();
-          
-          // Regex to capture the Base64 string inside Markdown
-          // Matches: ![Alt](data:image/...)
-          const regex = /!\[.*?\]\((data:image\/.*?;base64,.*?)\)/;
-          const match = regex.exec(text);
+        // Format: ![Generated Image](data:image/jpeg;base64,...) or ![Generated Image](/api/py/images/<sha256>)
+        else if (block.type === 'text' && typeof block.value === 'string'
+                 && (block.value.includes('data:image') || block.value.includes('/api/py/images/'))) {
+          const text = block.value.trim();
+          const dataMatch = dataImageRegex.exec(text);
+          const storeMatch = dataMatch ? null : storeImageRegex.exec(text);
 
-          if (match) {
-            const base64Str = match[1];
+          if (dataMatch || storeMatch) {
             try {
               console.log(`[Processor] Converting Markdown Image to Image Block...`);
-              const url = await uploadBase64ToGCS(base64Str, `generated/${userId}`);
-              
+              const url = dataMatch
+                ? await uploadBase64ToGCS(dataMatch[1], `generated/${userId}`)
+                : await uploadStoreImageToGCS(storeMatch[1], `generated/${userId}`);
+
               // TRANSFORM THE BLOCK: Text -> Image URL
               // This is crucial so the frontend renders it as an image, not markdown text.
               newBlock.type = 'image_url';
               newBlock.value = url;
-              
+
               console.log(`[Processor] ✅ Converted to type: 'image_url'`);
             } catch (e) {
               console.error('[Processor] Failed to process markdown image:', e);